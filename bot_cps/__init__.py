@@ -42,6 +42,7 @@ extensions = (
     f"{__title__}.ping",
     f"{__title__}.roulette",
     f"{__title__}.stage",
+    f"{__title__}.stats",
     f"{__title__}.team",
     f"{__title__}.tos",
 )
@@ -23,12 +23,21 @@ along with this program. If not, see <https://www.gnu.org/licenses/>.
 import logging
 import os
 from argparse import ArgumentParser, Namespace
-from glob import glob
-from os.path import abspath, basename, dirname, splitext
 
 from discord import Activity, ActivityType, Intents, Object
 from discord.ext import commands
 
+from . import extensions
+from .accounting import instrument
+from .audit import get_writer
+from .config import config
+from .cooldown import cooldown
+from .health import HealthServer
+from .lag import lag
+from .metric import metric
+from .profiler import profiler
+from .sink import get_sink
+from .tracing import tracer
 from .translator import Translator
 
 
@@ -42,29 +51,78 @@ def get_option() -> Namespace:
                                  If not specified, these will be registered as global commands.")
     argparser.add_argument("--log", default=0,
                            help="Channel ID on which the command log is sent.")
+    argparser.add_argument("--log-policy", action="append", default=[],
+                           help="Log policy of an interaction class as CLASS=POLICY, \
+                                 e.g. view=sample:0.1. POLICY is one of full, \
+                                 sample:<rate>, aggregate and none.")
+    argparser.add_argument("--audit", default="",
+                           help="Directory in which the audit log is written.")
+    argparser.add_argument("--cluster-dir", default="",
+                           help="Directory shared by all processes of the bot \
+                                 to add up the number of guilds.")
+    argparser.add_argument("--cluster-id", default="",
+                           help="Name of this process in --cluster-dir, unique among the \
+                                 processes. Defaults to its shards, or its pid if unsharded.")
+    argparser.add_argument("--stats", action="store_true",
+                           help="Records latency histograms of commands shown by /stats.")
+    argparser.add_argument("--lag-threshold", type=float, default=0.,
+                           help="Seconds of event loop stall recorded by the lag monitor, \
+                                 e.g. 0.2. The monitor is disabled by default.")
+    argparser.add_argument("--trace", default="",
+                           help="Directory in which slow traces of interactions are written.")
+    argparser.add_argument("--trace-slow", type=float, default=1.,
+                           help="Seconds over which a trace is always written. \
+                                 1%% of faster traces are written as samples.")
+    argparser.add_argument("--health-port", type=int, default=0,
+                           help="Port on localhost serving health probes and metrics. \
+                                 0 disables the server.")
+    argparser.add_argument("--cooldown", action="append", default=[],
+                           help="Cooldown of render commands as SCOPE=COUNT/SECONDS, \
+                                 e.g. user=3/15. SCOPE is user or guild.")
     return argparser.parse_args()
 
 
 class Bot(commands.Bot):
-    def __init__(self, locals: list[int] = [], channel_id: int = 0) -> None:
+    def __init__(self, locals: list[int] = [], channel_id: int = 0, log_policy: list[str] = [],
+                 audit_dir: str = "", cluster_dir: str = "", stats: bool = False,
+                 lag_threshold: float = 0., trace_dir: str = "", trace_slow: float = 1.,
+                 health_port: int = 0, cooldown_policy: list[str] = [],
+                 cluster_id: str = "") -> None:
         self.locals = locals
         self.channel_id = channel_id
+        self.log_policy = dict(policy.split("=", 1) for policy in log_policy)
+        self.audit_dir = audit_dir
+        self.cluster_dir = cluster_dir
+        self.cluster_id = cluster_id
+        metric.enabled = stats
+        self.lag_threshold = lag_threshold
+        tracer.directory = trace_dir
+        tracer.slow = trace_slow
+        self.health = HealthServer(self, health_port) if health_port else None
+
+        policy = dict(policy.split("=", 1) for policy in cooldown_policy)
+        cooldown.configure(config.cooldown | {
+            scope: (int(value.split("/")[0]), float(value.split("/")[1]))
+            for scope, value in policy.items()
+        })
 
         intents = Intents.default()
 
         super().__init__(command_prefix="/", help_command=None, intents=intents)
 
     async def setup_hook(self) -> None:
-        root_path = dirname(abspath(__file__))
-        files = glob(f"{root_path}/[!_]*.py")
-
         await self.tree.set_translator(Translator())
+        instrument(self)
+
+        if self.lag_threshold > 0:
+            lag.start(self.lag_threshold)
+        if self.health is not None:
+            await self.health.start()
 
-        for ext in map(lambda file: splitext(basename(file))[0], files):
-            try:
-                await self.load_extension(f"bot_cps.{ext}")
-            except commands.NoEntryPointError:
-                pass
+        # only cogs are loaded; loading a helper module as an extension would
+        # execute it again and leave the cogs with unconfigured singletons
+        for ext in extensions:
+            await self.load_extension(ext)
 
         if self.locals:
             for local in self.locals:
@@ -77,6 +135,19 @@ class Bot(commands.Bot):
     async def on_ready(self) -> None:
         logger.info(f"Logged in as {self.user}({self.user.id})")
 
+    async def close(self) -> None:
+        lag.stop()
+        profiler.close()
+        if self.health is not None:
+            await self.health.close()
+        sink = get_sink(self)
+        if sink is not None:
+            await sink.close()
+        writer = get_writer(self)
+        if writer is not None:
+            await writer.close()
+        await super().close()
+
 
     def run(self, token: str) -> None:
         super().run(token, root_logger=True)
@@ -84,5 +155,7 @@ class Bot(commands.Bot):
 
 if __name__ == "__main__":
     args = get_option()
-    bot = Bot(args.local, args.log)
+    bot = Bot(args.local, args.log, args.log_policy, args.audit, args.cluster_dir,
+              args.stats, args.lag_threshold, args.trace, args.trace_slow,
+              args.health_port, args.cooldown, args.cluster_id)
     bot.run(os.environ["DISCORD_TOKEN"])
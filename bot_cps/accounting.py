@@ -0,0 +1,172 @@
+"""
+A program that provides bot managed by bot_cps
+
+The GNU General Public License v3.0 (GPL-3.0)
+
+Copyright (C) 2021-present ster <ster.physics@gmail.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program. If not, see <https://www.gnu.org/licenses/>.
+
+"""
+
+__all__ = (
+    "Usage",
+    "instrument",
+    "ledger",
+)
+
+
+import logging
+from contextvars import ContextVar
+from dataclasses import dataclass, fields
+from threading import Lock
+from typing import Any, Awaitable, Callable, Sequence
+
+from discord import Client, File
+
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Usage:
+    """Resources used by invocations."""
+    count: int = 0
+    cpu: float = 0.
+    encoded: int = 0
+    uploaded: int = 0
+    rest: int = 0
+
+    def add(self, other: "Usage") -> None:
+        for field in fields(self):
+            setattr(self, field.name, getattr(self, field.name) + getattr(other, field.name))
+
+    def peak(self, other: "Usage") -> None:
+        for field in fields(self):
+            setattr(self, field.name, max(getattr(self, field.name), getattr(other, field.name)))
+
+
+class Ledger(object):
+    """Tallies resources used by each invocation of commands and views.
+
+    The usage of the running invocation is kept in a ContextVar, so render
+    workers (which run in a copy of the context) and REST requests made in
+    the task are charged to it. Usages are rolled up per command and per
+    guild when the invocation ends.
+
+    ``cpu`` counts CPU seconds spent in render workers only; CPU time on the
+    event loop thread cannot be told apart between interleaved tasks.
+
+    ```python
+    ledger.begin("deck", guild_id)
+    ...
+    ledger.end()
+    ledger.check("deck", rest=3)  # raises AssertionError if exceeded
+    ```
+
+    """
+
+    def __init__(self) -> None:
+        self.current: ContextVar[tuple[str, int | None, Usage] | None] \
+            = ContextVar("usage", default=None)
+        self.commands: dict[str, Usage] = {}
+        self.guilds: dict[int | None, Usage] = {}
+        # largest usage of a single invocation of each command
+        self.peaks: dict[str, Usage] = {}
+        self.lock = Lock()
+
+    def begin(self, name: str, guild_id: int | None) -> None:
+        """Starts charging the current context to ``name``."""
+        self.current.set((name, guild_id, Usage(count=1)))
+
+    def end(self) -> None:
+        """Rolls up the usage of the current context."""
+        current = self.current.get()
+        if current is None:
+            return
+        self.current.set(None)
+
+        name, guild_id, usage = current
+        self.commands.setdefault(name, Usage()).add(usage)
+        self.guilds.setdefault(guild_id, Usage()).add(usage)
+        self.peaks.setdefault(name, Usage()).peak(usage)
+        return
+
+    def charge(self, **kwargs: float) -> None:
+        """Adds resources to the usage of the current context, from any thread."""
+        current = self.current.get()
+        if current is None:
+            return
+        usage = current[2]
+        with self.lock:
+            for key, value in kwargs.items():
+                setattr(usage, key, getattr(usage, key) + value)
+
+    def top_guilds(self, n: int = 10, key: str = "cpu") -> list[tuple[int | None, Usage]]:
+        """Obtains ``n`` guilds using the most ``key``."""
+        return sorted(self.guilds.items(), key=lambda item: -getattr(item[1], key))[:n]
+
+    def check(self, name: str, **bounds: float) -> None:
+        """Asserts that no invocation of ``name`` has exceeded ``bounds``.
+
+        ```python
+        ledger.check("deck", rest=3, uploaded=8 * 2**20)
+        ```
+
+        """
+        peak = self.peaks.get(name, Usage())
+        for key, bound in bounds.items():
+            value = getattr(peak, key)
+            assert value <= bound, f"{name} used {value} {key}, more than {bound}."
+
+    def reset(self) -> None:
+        self.commands.clear()
+        self.guilds.clear()
+        self.peaks.clear()
+
+
+ledger = Ledger()
+
+del Ledger
+
+
+def _size(files: Sequence[File] | None) -> int:
+    """Obtains the total bytes of ``files`` held in memory."""
+    size = 0
+    for file in files or ():
+        getbuffer = getattr(file.fp, "getbuffer", None)
+        if getbuffer is not None:
+            size += getbuffer().nbytes
+    return size
+
+
+def _counted(request: Callable[..., Awaitable[Any]]) -> Callable[..., Awaitable[Any]]:
+    async def counted(*args: Any, **kwargs: Any) -> Any:
+        ledger.charge(rest=1, uploaded=_size(kwargs.get("files")))
+        return await request(*args, **kwargs)
+    return counted
+
+
+def instrument(client: Client) -> None:
+    """Charges REST requests of ``client`` and of interaction webhooks to the ledger."""
+    client.http.request = _counted(client.http.request)
+
+    # interaction responses and followups are sent through the webhook adapter
+    try:
+        from discord.webhook.async_ import async_context
+        adapter = async_context.get()
+        adapter.request = _counted(adapter.request)
+    except (ImportError, AttributeError):
+        logger.warning("REST requests of interactions are not counted.")
+    return
@@ -0,0 +1,142 @@
+"""
+A program that provides bot managed by bot_cps
+
+The GNU General Public License v3.0 (GPL-3.0)
+
+Copyright (C) 2021-present ster <ster.physics@gmail.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program. If not, see <https://www.gnu.org/licenses/>.
+
+"""
+
+__all__ = (
+    "admission",
+)
+
+
+from asyncio import CancelledError, Future, get_running_loop
+from collections import OrderedDict, deque
+from typing import Hashable
+
+from .exception import Busy
+from .heavy import heavy
+from .lag import lag
+from .render import render
+
+
+class Admission(object):
+    """Admits render commands with per-guild fair queueing and load shedding.
+
+    At most ``concurrency`` invocations run at once. Others wait in a queue
+    per guild, and freed slots are handed to the guilds in turn, so that
+    a burst from one guild does not hold back the others.
+
+    ``check`` sheds load before the interaction is acknowledged, when the
+    event loop lags more than ``max_lag`` seconds, the render pool has more
+    than ``max_depth`` jobs or ``maxsize`` invocations are waiting. A guild
+    using more than ``max_share`` of the recent render cost is shed once
+    the queue is half full.
+
+    ```python
+    admission.check(guild_id)  # raises Busy
+    await admission.acquire(guild_id)
+    try:
+        ...
+    finally:
+        admission.release()
+    ```
+
+    """
+
+    def __init__(self, concurrency: int = 2 * render.max_workers, maxsize: int = 64,
+                 max_lag: float = .5, max_depth: int = 8 * render.max_workers,
+                 max_share: float = .25) -> None:
+        self.concurrency: int = concurrency
+        self.maxsize: int = maxsize
+        self.max_lag: float = max_lag
+        self.max_depth: int = max_depth
+        self.max_share: float = max_share
+
+        self.active: int = 0
+        self.waiting: int = 0
+        self.queues: OrderedDict[Hashable, deque[Future]] = OrderedDict()
+        self.shed: int = 0
+
+    def check(self, guild_id: int | None) -> None:
+        """Raises ``Busy`` if an invocation from the guild should be shed now."""
+        if lag.lag > self.max_lag:
+            reason = f"event loop lags {lag.lag:.2f}s"
+        elif render.depth > self.max_depth:
+            reason = f"{render.depth} render jobs are pending"
+        elif self.waiting >= self.maxsize:
+            reason = f"{self.waiting} invocations are waiting"
+        elif self.waiting >= self.maxsize // 2 and heavy.guilds.share(guild_id) > self.max_share:
+            reason = f"guild {guild_id} uses too much render cost"
+        else:
+            return
+        self.shed += 1
+        raise Busy(reason)
+
+    async def acquire(self, guild_id: int | None) -> None:
+        """Waits for a slot, in turn with the other guilds."""
+        if self.active < self.concurrency and self.waiting == 0:
+            self.active += 1
+            return
+        if self.waiting >= self.maxsize:
+            self.shed += 1
+            raise Busy(f"{self.waiting} invocations are waiting")
+
+        future = get_running_loop().create_future()
+        self.queues.setdefault(guild_id, deque()).append(future)
+        self.waiting += 1
+        try:
+            # the slot is handed over by ``release``
+            await future
+        except CancelledError:
+            if future.done() and not future.cancelled():
+                self.release()
+            else:
+                self._remove(guild_id, future)
+            raise
+
+    def release(self) -> None:
+        """Frees a slot, handing it to the next guild waiting."""
+        while self.queues:
+            guild_id, queue = next(iter(self.queues.items()))
+            future = queue.popleft()
+            self.waiting -= 1
+            if queue:
+                self.queues.move_to_end(guild_id)
+            else:
+                del self.queues[guild_id]
+
+            if not future.done():
+                future.set_result(None)
+                return
+        self.active -= 1
+        return
+
+    def _remove(self, guild_id: int | None, future: Future) -> None:
+        queue = self.queues.get(guild_id)
+        if queue is None or future not in queue:
+            return
+        queue.remove(future)
+        self.waiting -= 1
+        if not queue:
+            del self.queues[guild_id]
+
+
+admission = Admission()
+
+del Admission
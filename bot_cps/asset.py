@@ -0,0 +1,108 @@
+"""
+A program that provides bot managed by bot_cps
+
+The GNU General Public License v3.0 (GPL-3.0)
+
+Copyright (C) 2021-present ster <ster.physics@gmail.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program. If not, see <https://www.gnu.org/licenses/>.
+
+"""
+
+__all__ = (
+    "asset",
+)
+
+
+import json
+import os
+from types import MappingProxyType
+from typing import Any, Literal, Mapping
+
+from .path import path
+
+
+def _freeze(obj: Any) -> Any:
+    """Converts ``dict`` and ``list`` recursively into immutable types."""
+    if isinstance(obj, dict):
+        return MappingProxyType({key: _freeze(value) for key, value in obj.items()})
+    if isinstance(obj, list):
+        return tuple(_freeze(value) for value in obj)
+    return obj
+
+
+def _read(file: str, mode: Literal["r", "rb"] = "r") -> str | bytes:
+    with open(file, mode) as f:
+        return f.read()
+
+
+class Asset(object):
+    """Asset files loaded once at startup.
+
+    Every cog should read assets from here instead of the filesystem.
+
+    """
+
+    def __init__(self) -> None:
+        self._emoji = _freeze(json.loads(_read(path.emoji_json)))
+        self._gacha = _freeze(json.loads(_read(path.gacha_json)))
+
+        self._team = MappingProxyType({
+            "blue": _read(path.blue_team, "rb"),
+            "red": _read(path.red_team, "rb"),
+            "white": _read(path.white_team, "rb"),
+        })
+
+        self._terms_of_service: str = _read(path.terms_of_service)
+
+        self._docs = MappingProxyType({
+            locale: MappingProxyType({
+                kind: MappingProxyType({
+                    cmd: _read(f"{path.docs_dir}/{locale}/{kind}/{cmd}")
+                    for cmd in sorted(os.listdir(f"{path.docs_dir}/{locale}/{kind}"))
+                })
+                for kind in ("title", "detail")
+            })
+            for locale in sorted(os.listdir(path.docs_dir))
+        })
+
+    @property
+    def emoji(self) -> Mapping[str, Mapping[str, str]]:
+        """Contents of ``emoji.json``."""
+        return self._emoji
+
+    @property
+    def gacha(self) -> tuple[Mapping[str, Any], ...]:
+        """Contents of ``gacha.json``."""
+        return self._gacha
+
+    @property
+    def team(self) -> Mapping[Literal["blue", "red", "white"], bytes]:
+        """PNG bytes of the team portal images."""
+        return self._team
+
+    @property
+    def terms_of_service(self) -> str:
+        """Text of the Terms of Service."""
+        return self._terms_of_service
+
+    @property
+    def docs(self) -> Mapping[str, Mapping[Literal["title", "detail"], Mapping[str, str]]]:
+        """Command docs for each locale, indexed by kind and command name."""
+        return self._docs
+
+
+asset = Asset()
+
+del Asset
@@ -0,0 +1,307 @@
+"""
+A program that provides bot managed by bot_cps
+
+The GNU General Public License v3.0 (GPL-3.0)
+
+Copyright (C) 2021-present ster <ster.physics@gmail.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program. If not, see <https://www.gnu.org/licenses/>.
+
+"""
+
+__all__ = (
+    "AuditWriter",
+    "audit",
+    "get_writer",
+)
+
+
+import gzip
+import json
+import logging
+import os
+import shutil
+from argparse import ArgumentParser, Namespace
+from asyncio import Queue, QueueEmpty, QueueFull, Task, create_task, get_running_loop
+from collections import Counter, defaultdict
+from contextvars import Context
+from datetime import datetime
+from glob import glob
+from time import time
+from typing import Any, Iterator, Literal
+
+from discord import Client, Interaction
+
+from .metric import Histogram
+
+
+logger = logging.getLogger(__name__)
+
+
+class AuditWriter(object):
+    """Writes audit records to JSON Lines files from a background task.
+
+    The current file is ``audit.jsonl`` in ``directory``. It is rotated when
+    it grows over ``max_bytes`` or gets older than ``max_age`` seconds, and
+    rotated files are compressed to ``audit-<epoch>.jsonl.gz`` where
+    ``<epoch>`` is the time the file was opened in milliseconds.
+
+    """
+
+    def __init__(self, directory: str, maxsize: int = 10_000,
+                 max_bytes: int = 64 * 2**20, max_age: float = 86400.) -> None:
+        """Constructor of this class.
+
+        Parameters
+        ----------
+        directory: :class:`str`
+            Directory in which audit files are written.
+        maxsize: :class:`int`
+            Maximum number of queued records. Records beyond this are dropped.
+        max_bytes: :class:`int`
+            Size in bytes at which the current file is rotated.
+        max_age: :class:`float`
+            Seconds after which the current file is rotated.
+
+        """
+        self.directory: str = directory
+        self.max_bytes: int = max_bytes
+        self.max_age: float = max_age
+
+        # ``None`` tells the background task to stop
+        self.queue: Queue[dict[str, Any] | None] = Queue(maxsize)
+        self.task: Task | None = None
+        self.dropped: int = 0
+        self.closed: bool = False
+
+        # time the current file was opened
+        self.opened: float | None = None
+
+        os.makedirs(directory, exist_ok=True)
+
+    @property
+    def current(self) -> str:
+        return f"{self.directory}/audit.jsonl"
+
+    @property
+    def depth(self) -> int:
+        """Number of records waiting to be written."""
+        return self.queue.qsize()
+
+    def put(self, record: dict[str, Any]) -> None:
+        """Enqueues ``record`` and returns immediately."""
+        if self.closed:
+            self.dropped += 1
+            return
+
+        if self.task is None or self.task.done():
+            # in an empty context, so that it is not attributed to the command
+            # which happens to start it
+            self.task = Context().run(create_task, self._run())
+
+        try:
+            self.queue.put_nowait(record)
+        except QueueFull:
+            self.dropped += 1
+        return
+
+    def _drain(self) -> list[dict[str, Any] | None]:
+        records = []
+        while True:
+            try:
+                records.append(self.queue.get_nowait())
+            except QueueEmpty:
+                return records
+
+    async def _run(self) -> None:
+        loop = get_running_loop()
+        stopping = False
+        while not stopping:
+            records = [await self.queue.get()] + self._drain()
+            stopping = None in records
+            records = [record for record in records if record is not None]
+            if records != []:
+                await loop.run_in_executor(None, self._write, records)
+
+    def _write(self, records: list[dict[str, Any]]) -> None:
+        """Appends ``records`` to the current file, rotating it if needed."""
+        if not os.path.exists(self.current):
+            self.opened = time()
+        elif self.opened is None:
+            with open(self.current, "r") as f:
+                first = f.readline()
+            self.opened = json.loads(first)["ts"] if first else time()
+
+        if os.path.exists(self.current) and (os.path.getsize(self.current) >= self.max_bytes
+                                             or time() - self.opened >= self.max_age):
+            self._rotate(int(self.opened * 1000))
+            self.opened = time()
+
+        with open(self.current, "a") as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+
+    def _rotate(self, opened: int) -> None:
+        """Compresses the current file into an archive."""
+        archive = f"{self.directory}/audit-{opened}.jsonl.gz"
+        with open(self.current, "rb") as src, gzip.open(archive, "wb") as dst:
+            shutil.copyfileobj(src, dst)
+        os.remove(self.current)
+
+    async def close(self) -> None:
+        """Stops the background task and writes all queued records."""
+        self.closed = True
+
+        # lets the background task finish the write in flight and stop by itself
+        if self.task is not None and not self.task.done():
+            await self.queue.put(None)
+            await self.task
+
+        records = [record for record in self._drain() if record is not None]
+        if records != []:
+            await get_running_loop().run_in_executor(None, self._write, records)
+
+        if self.dropped:
+            logger.warning(f"{self.dropped} audit records were dropped.")
+        return
+
+
+def get_writer(client: Client) -> AuditWriter | None:
+    """Obtains the ``AuditWriter`` of ``client``, or ``None`` if auditing is disabled."""
+    directory: str = getattr(client, "audit_dir", "")
+    if directory == "":
+        return None
+
+    if not hasattr(client, "audit_writer"):
+        client.audit_writer = AuditWriter(directory)
+    return client.audit_writer
+
+
+def audit(interaction: Interaction, kind: Literal["command", "context_menu", "view"],
+          name: str, latency: float | None = None, ack: float | None = None,
+          **kwargs: Any) -> None:
+    """Records the use of a command or view to the audit log.
+
+    Parameters
+    ----------
+    interaction: :class:``discord.Interaction``
+        Target interaction.
+    kind: :class:`str`
+        Kind of the interaction.
+    name: :class:`str`
+        Name of the command or the command related to the view.
+    latency: :class:`float` | None
+        Seconds from the interaction to the end of the command.
+    ack: :class:`float` | None
+        Seconds from the interaction to its acknowledgement.
+    **kwargs: Any
+        Arguments of the target command.
+
+    """
+    writer = get_writer(interaction.client)
+    if writer is None:
+        return
+
+    writer.put({
+        "ts": time(),
+        "kind": kind,
+        "name": name,
+        "guild": interaction.guild_id,
+        "user": interaction.user.id,
+        "latency": latency,
+        "ack": ack,
+        "kwargs": kwargs,
+    })
+    return
+
+
+def _files(directory: str, start: float, end: float) -> Iterator[str]:
+    """Yields audit files which may contain records between ``start`` and ``end``."""
+    archives = sorted((int(os.path.basename(file)[6:-9]) / 1000, file)
+                      for file in glob(f"{directory}/audit-*.jsonl.gz"))
+    opened = [ts for ts, _ in archives] + [float("inf")]
+
+    for idx, (ts, file) in enumerate(archives):
+        # each archive covers the time until the next one was opened
+        if ts <= end and opened[idx + 1] >= start:
+            yield file
+
+    if os.path.exists(f"{directory}/audit.jsonl"):
+        yield f"{directory}/audit.jsonl"
+
+
+def _records(directory: str, start: float, end: float) -> Iterator[dict[str, Any]]:
+    """Streams records between ``start`` and ``end``."""
+    for file in _files(directory, start, end):
+        opener = gzip.open if file.endswith(".gz") else open
+        with opener(file, "rt") as f:
+            for line in f:
+                record = json.loads(line)
+                if start <= record["ts"] <= end:
+                    yield record
+
+
+def get_option() -> Namespace:
+    argparser = ArgumentParser(prog="python -m bot_cps.audit",
+                               description="Aggregates audit logs written by bot_cps.")
+    argparser.add_argument("directory", help="Directory in which audit files are written.")
+    argparser.add_argument("--since", type=datetime.fromisoformat, default=None,
+                           help="Start of the time range in ISO 8601 format.")
+    argparser.add_argument("--until", type=datetime.fromisoformat, default=None,
+                           help="End of the time range in ISO 8601 format.")
+    argparser.add_argument("--top", type=int, default=10,
+                           help="Number of guilds to show.")
+    return argparser.parse_args()
+
+
+def main() -> None:
+    args = get_option()
+    start = args.since.timestamp() if args.since else 0.
+    end = args.until.timestamp() if args.until else float("inf")
+
+    counts: Counter[str] = Counter()
+    guilds: Counter[int] = Counter()
+    # fixed buckets keep memory bounded however many records are read, and
+    # percentiles are bucket upper bounds like those of ``metric``
+    latencies: defaultdict[str, Histogram] = defaultdict(Histogram)
+    acks: defaultdict[str, Histogram] = defaultdict(Histogram)
+
+    for record in _records(args.directory, start, end):
+        name = record["name"] if record["kind"] != "view" else f"{record['name']} (view)"
+        counts[name] += 1
+        guilds[record["guild"]] += 1
+        if record["latency"] is not None:
+            latencies[name].observe(record["latency"])
+        if record.get("ack") is not None:
+            acks[name].observe(record["ack"])
+
+    print(f"{'command':<24}{'count':>10}{'p50 [s]':>10}{'p95 [s]':>10}{'max [s]':>10}"
+          f"{'ack p95 [s]':>14}")
+    for name, count in counts.most_common():
+        latency = latencies[name]
+        if latency.count == 0:
+            print(f"{name:<24}{count:>10}")
+            continue
+        ack = f"{acks[name].percentile(.95):>14.3f}" if acks[name].count else ""
+        print(f"{name:<24}{count:>10}{latency.percentile(.5):>10.3f}"
+              f"{latency.percentile(.95):>10.3f}{latency.max:>10.3f}{ack}")
+
+    print()
+    print(f"{'guild':<24}{'count':>10}")
+    for guild, count in guilds.most_common(args.top):
+        print(f"{str(guild):<24}{count:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -27,31 +27,55 @@ __all__ = (
 )
 
 
+import fcntl
 import json
 import logging
-from asyncio import Task, create_task
+import os
+from asyncio import Task, create_task, get_running_loop
 from datetime import datetime, timedelta, timezone
+from functools import wraps
 from logging import Logger
+from time import monotonic
 from traceback import print_exception
 from typing import Any
+from weakref import WeakSet
 
-from discord import ButtonStyle, Embed, Interaction, Locale, ui
+from discord import ButtonStyle, Embed, Interaction, Locale, ui, utils
 from discord.app_commands import check
 from discord.ext import commands
 from discord.ext.commands import Bot, Context
 from discord.interactions import Interaction
 
+from .accounting import ledger
+from .admission import admission
+from .asset import asset
+from .audit import audit
 from .config import config
-from .exception import NotAgreed
+from .cooldown import cooldown
+from .exception import Busy, CoolingDown, NotAgreed
+from .heavy import heavy
+from .lag import lag
+from .metric import metric
 from .path import path
+from .profiler import profiler
+from .sink import event_class, get_sink
+from .tracing import tracer
 from .translator import locale_str as _
 
 
 logger = logging.getLogger(__name__)
 
 
+def since(interaction: Interaction) -> float:
+    """Obtains seconds elapsed since ``interaction`` was created."""
+    return (utils.utcnow() - interaction.created_at).total_seconds()
+
+
 async def send_log(interaction: Interaction, cmd: str, **kwargs: Any) -> None:
-    """Sends log to ``client.channel_id``.
+    """Queues log to be sent to ``client.channel_id``.
+
+    Logs are sent in batches by ``LogSink``, so this does not wait for Discord.
+    Depending on the log policy, the log may be sampled out or only counted.
 
     Parameters
     ----------
@@ -64,11 +88,11 @@ async def send_log(interaction: Interaction, cmd: str, **kwargs: Any) -> None:
 
     """
 
-    if not hasattr(interaction.client, "channel_id"):
+    sink = get_sink(interaction.client)
+    if sink is None:
         return
 
-    channel_id: int = interaction.client.channel_id
-    if channel_id == 0:
+    if not sink.admit(event_class(interaction), str(cmd), interaction.guild_id):
         return
 
     date = (interaction.created_at).strftime("%s")
@@ -84,8 +108,7 @@ async def send_log(interaction: Interaction, cmd: str, **kwargs: Any) -> None:
     embed = Embed(color=interaction.user.color, description=description)
     name = f"{interaction.user.display_name}（{interaction.user.id}）"
     embed.set_author(name=name, icon_url=interaction.user.avatar.url)
-    channel = await interaction.client.fetch_channel(channel_id)
-    await channel.send(embed=embed)
+    sink.put(embed)
     return
 
 class YesButton(ui.Button):
@@ -102,7 +125,7 @@ class YesButton(ui.Button):
     async def callback(self, interaction: Interaction) -> None:
         await interaction.response.defer()
         self.view.disable()
-        self.view.add_user_to_agreed(interaction)
+        await self.view.add_user_to_agreed(interaction)
         content = _("利用規約に同意しました").to(self.locale)
         await interaction.followup.edit_message(interaction.message.id,
                                                 content=content, view=self.view)
@@ -152,21 +175,74 @@ class Confirm(ui.View):
         self.logger.info(f"[View: {self.related}]"\
                          f" has been used by {interaction.user}({interaction.user.id}).")
         await send_log(interaction, self.related)
+        audit(interaction, "view", self.related)
         return True
 
-    def add_user_to_agreed(self, interaction: Interaction) -> dict:
+    async def add_user_to_agreed(self, interaction: Interaction) -> dict:
         """Adds the user to the agreed list."""
+        return await agreed.add(interaction.user.id)
+
+class Agreed(object):
+    """
+    Users who have agreed to the Terms of Service.
+
+    The file is shared by all processes of the bot, so it is the source of
+    truth: the in-memory copy only serves lookups and is read again when
+    a user is not found in it and the file has changed since, at most once
+    per ``interval`` seconds.
+    """
+    def __init__(self, interval: float = 1.) -> None:
+        self.interval: float = interval
+        self._users: dict[int, dict] | None = None
+        self._mtime: int = 0
+        self._checked: float = 0.
+
+    def _read(self) -> dict[int, dict]:
         with open(path.agreed_json, "r") as f:
-            agreed_list = json.load(f)
+            return {agreed["id"]: agreed for agreed in json.load(f)}
+
+    def get(self, user_id: int) -> dict:
+        """Obtains the agreement of the user, or ``{}`` if not agreed."""
+        if self._users is None:
+            self._mtime = os.stat(path.agreed_json).st_mtime_ns
+            self._users = self._read()
+        elif user_id not in self._users and monotonic() - self._checked >= self.interval:
+            # the user may have agreed in another process
+            self._checked = monotonic()
+            mtime = os.stat(path.agreed_json).st_mtime_ns
+            if mtime != self._mtime:
+                self._mtime = mtime
+                self._users = self._read()
+        return self._users.get(user_id, {})
+
+    async def add(self, user_id: int) -> dict:
+        """Adds the user to the agreed list and writes it to the file.
+
+        The file is read again and replaced atomically under a lock, so that
+        agreements added by other processes are kept. The lock and the file
+        are handled in the executor, off the event loop.
 
+        """
+        return await get_running_loop().run_in_executor(None, self._add, user_id)
+
+    def _add(self, user_id: int) -> dict:
         date = (datetime.now(timezone.utc) + timedelta(hours=9)).strftime("%Y/%m/%d %H:%M:%S")
-        agreed = {"id":int(str(interaction.user.id)), "date":date}
-        agreed_list.append(agreed)
 
-        with open(path.agreed_json, "w") as f:
-            json.dump(agreed_list, f, indent=4, ensure_ascii=False)
+        with open(f"{path.agreed_json}.lock", "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            users = self._read()
+            users.setdefault(user_id, {"id":int(str(user_id)), "date":date})
+
+            tmp = f"{path.agreed_json}.{os.getpid()}.tmp"
+            with open(tmp, "w") as f:
+                json.dump([*users.values()], f, indent=4, ensure_ascii=False)
+            os.replace(tmp, path.agreed_json)
+            mtime = os.stat(path.agreed_json).st_mtime_ns
 
-        return agreed
+        self._users, self._mtime = users, mtime
+        return users[user_id]
+
+agreed = Agreed()
 
 async def confirm_tos(interaction: Interaction) -> None:
     """
@@ -182,8 +258,7 @@ async def send_tos(interaction: Interaction) -> None:
 
     embeds: list[Embed] = []
 
-    with open(path.terms_of_service, "r") as f:
-        tos = f.readlines()
+    tos = asset.terms_of_service.splitlines(keepends=True)
 
     tos_former = "".join(tos[:32])
     tos_latter = "".join(tos[33:])
@@ -199,22 +274,27 @@ async def send_tos(interaction: Interaction) -> None:
     else:
         await interaction.followup.send(embeds=embeds, ephemeral=True)
 
-async def check_agreed(interaction: Interaction) -> None:
-    """Confirms agreement to the Terms of Service."""
-
-    def check_in_agreed_list(interaction: Interaction) -> dict:
-        """Checks whether the user is in the agreed list."""
-        with open(path.agreed_json, "r") as f:
-            agreed_list = json.load(f)
+async def send_busy(interaction: Interaction) -> None:
+    """Tells the user to try again later."""
+    content = _("混み合っているよ！少し待ってからもう一度試してね！").to(interaction.locale)
+    if not interaction.response.is_done():
+        await interaction.response.send_message(content=content, ephemeral=True)
+    else:
+        await interaction.followup.send(content=content, ephemeral=True)
 
-        for agreed in agreed_list:
-            if agreed["id"] == interaction.user.id:
-                return agreed
-        return {}
+async def send_cooldown(interaction: Interaction, retry_after: float) -> None:
+    """Tells the user when the command can be used again."""
+    content = _("クールダウン中だよ！<t:{0}:R>にもう一度試してね！").to(interaction.locale)
+    content = content.format(cooldown.until(retry_after))
+    if not interaction.response.is_done():
+        await interaction.response.send_message(content=content, ephemeral=True)
+    else:
+        await interaction.followup.send(content=content, ephemeral=True)
 
-    agreed = check_in_agreed_list(interaction)
+async def check_agreed(interaction: Interaction) -> None:
+    """Confirms agreement to the Terms of Service."""
 
-    if agreed == {}:
+    if agreed.get(interaction.user.id) == {}:
         await send_tos(interaction)
         await confirm_tos(interaction)
         raise NotAgreed(f"{interaction.user} has not agreed to the Terms of Service.")
@@ -239,6 +319,7 @@ class Cog(commands.Cog):
         super().__init__()
         self.bot: Bot = bot
         self.logger: Logger = logger
+        self.ready: bool = False
         task = create_task(self._run_once_when_ready())
         task.add_done_callback(self._error_handler)
 
@@ -250,6 +331,7 @@ class Cog(commands.Cog):
     async def _run_once_when_ready(self) -> None:
         await self.bot.wait_until_ready()
         await self.run_once_when_ready()
+        self.ready = True
 
     async def run_once_when_ready(self) -> None:
         """
@@ -259,11 +341,114 @@ class Cog(commands.Cog):
         pass
 
     async def cog_before_invoke(self, ctx: Context) -> None:
+        """
+        Acknowledges the interaction before anything else so that
+        commands never exceed the 3-second window of Discord.
+
+        The interaction is deferred unless ``defer`` of the command extras
+        is ``False``, and deferred ephemerally if ``ephemeral`` is ``True``.
+        Users who have not agreed to the Terms of Service are not deferred,
+        so that the Terms of Service can be sent ephemerally.
+
+        Commands whose ``render`` is ``True`` are subject to ``cooldown``,
+        counted by ``heavy`` and go through ``admission``. A user repeating
+        a render command still running, on cooldown or facing a busy bot is
+        told so before the interaction is deferred. Cooldown is consumed only
+        by users who have agreed to the Terms of Service and only once the
+        bot is not shedding load.
+
+        """
+        try:
+            await self._before_invoke(ctx)
+        except BaseException:
+            # after hooks are not called when this raises
+            self._finish(ctx)
+            raise
+        return await super().cog_before_invoke(ctx)
+
+    async def _before_invoke(self, ctx: Context) -> None:
         self.logger.info(f"[{ctx.prefix}{ctx.command}]"\
                          f" has been used by {ctx.author}({ctx.author.id}).")
-        await send_log(ctx.interaction, ctx.command, **ctx.kwargs)
-        await check_agreed(ctx.interaction)
-        return await super().cog_before_invoke(ctx)
+        render = ctx.command.extras.get("render", False)
+        guild_id = ctx.guild.id if ctx.guild else None
+
+        metric.begin(ctx.command.qualified_name)
+        ledger.begin(ctx.command.qualified_name, guild_id)
+        tracer.begin(ctx.command.qualified_name, since(ctx.interaction),
+                     user=ctx.author.id, guild=guild_id)
+
+        # users who have not agreed are stopped by check_agreed below
+        agreement = agreed.get(ctx.author.id) != {}
+
+        if render and agreement:
+            key = (ctx.author.id, ctx.command.qualified_name)
+            if key in cooldown.inflight:
+                await send_busy(ctx.interaction)
+                raise Busy(f"{ctx.command} of {ctx.author} is still running.")
+
+            try:
+                admission.check(guild_id)
+            except Busy:
+                await send_busy(ctx.interaction)
+                raise
+
+            retry_after = cooldown.hit(ctx.author.id, guild_id)
+            if retry_after > 0:
+                await send_cooldown(ctx.interaction, retry_after)
+                raise CoolingDown(f"{ctx.author} is on cooldown for {retry_after:.1f}s.")
+
+            cooldown.inflight.add(key)
+            ctx.inflight = key
+
+        if agreement and ctx.command.extras.get("defer", True):
+            with tracer.span("defer"):
+                await ctx.defer(ephemeral=ctx.command.extras.get("ephemeral", False))
+        ctx.ack = since(ctx.interaction)
+        self.logger.debug(f"[{ctx.prefix}{ctx.command}] acknowledged in {ctx.ack*1000:.0f}ms.")
+        metric.observe("defer", ctx.ack)
+
+        with tracer.span("log"):
+            await send_log(ctx.interaction, ctx.command, **ctx.kwargs)
+        with tracer.span("agreement"):
+            await check_agreed(ctx.interaction)
+
+        if render:
+            heavy.record(ctx.command.qualified_name, guild_id, ctx.author.id)
+            with tracer.span("admission"):
+                try:
+                    await admission.acquire(guild_id)
+                except Busy:
+                    await send_busy(ctx.interaction)
+                    raise
+            ctx.admitted = True
+
+        lag.enter(ctx.command.qualified_name)
+        profiler.begin(ctx.command.qualified_name)
+
+    def _finish(self, ctx: Context) -> None:
+        """Closes what ``cog_before_invoke`` opened, whether the command succeeded or not."""
+        cooldown.inflight.discard(getattr(ctx, "inflight", None))
+        if getattr(ctx, "admitted", False):
+            ctx.admitted = False
+            admission.release()
+        profiler.end()
+        lag.exit()
+        tracer.finish()
+        ledger.end()
+
+    async def cog_command_error(self, ctx: Context, error: Exception) -> None:
+        # after hooks are not called when the command raises
+        self._finish(ctx)
+        self.logger.error(f"[{ctx.prefix}{ctx.command}] raised an exception.", exc_info=error)
+        return await super().cog_command_error(ctx, error)
+
+    async def cog_after_invoke(self, ctx: Context) -> None:
+        self._finish(ctx)
+        latency = since(ctx.interaction)
+        metric.observe("total", latency)
+        audit(ctx.interaction, "command", ctx.command.qualified_name,
+              latency, getattr(ctx, "ack", None), **ctx.kwargs)
+        return await super().cog_after_invoke(ctx)
 
     async def cog_load(self) -> None:
         self.logger.info(f"Cog {self.__cog_name__} has been loaded.")
@@ -297,11 +482,52 @@ def context_menu_before_invoke(logger: Logger, name: str):
     async def predicate(interaction: Interaction) -> bool:
         logger.info(f"[Context Menu: {name}]"\
                     f" has been used by {interaction.user}({interaction.user.id}).")
-        await send_log(interaction, interaction.command.name)
-        await check_agreed(interaction)
+        metric.begin(interaction.command.name)
+        ledger.begin(interaction.command.name, interaction.guild_id)
+        tracer.begin(interaction.command.name, since(interaction),
+                     user=interaction.user.id, guild=interaction.guild_id)
+        try:
+            with tracer.span("log"):
+                await send_log(interaction, interaction.command.name)
+            with tracer.span("agreement"):
+                await check_agreed(interaction)
+        except BaseException:
+            # the callback is not called when this raises
+            finish()
+            raise
+        lag.enter(interaction.command.name)
         return True
 
-    return check(predicate)
+    def finish() -> None:
+        lag.exit()
+        tracer.finish()
+        ledger.end()
+
+    def decorator(func):
+        # closes what predicate opened like the after hooks of commands
+        @wraps(func)
+        async def callback(*args: Any) -> None:
+            interaction: Interaction = args[-2]
+            try:
+                await func(*args)
+            finally:
+                finish()
+            latency = since(interaction)
+            metric.observe("total", latency)
+            audit(interaction, "context_menu", interaction.command.name, latency)
+
+        return check(predicate)(callback)
+
+    return decorator
+
+
+# all views alive, to count those still listening
+_views: WeakSet["View"] = WeakSet()
+
+
+def live_views() -> int:
+    """Obtains the number of views still accepting input."""
+    return sum(not view.is_finished() for view in _views)
 
 
 class View(ui.View):
@@ -327,6 +553,10 @@ class View(ui.View):
         self.related: str = related
         self.logger: Logger = logger
         super().__init__(timeout=timeout)
+        _views.add(self)
+
+        # exclusive items whose callback is running
+        self.inflight: set[ui.Item] = set()
 
     def disable(self) -> None:
         """Disables all children."""
@@ -345,6 +575,73 @@ class View(ui.View):
         """
         self.logger.info(f"[View: {self.related}]"\
                          f" has been used by {interaction.user}({interaction.user.id}).")
-        await send_log(interaction, self.related)
-        await check_agreed(interaction)
+        metric.begin(f"view:{self.related}")
+        ledger.begin(f"view:{self.related}", interaction.guild_id)
+        profiler.begin(f"view:{self.related}")
+        tracer.begin(f"view:{self.related}", since(interaction),
+                     user=interaction.user.id, guild=interaction.guild_id)
+        with tracer.span("log"):
+            await send_log(interaction, self.related)
+        audit(interaction, "view", self.related)
+        with tracer.span("agreement"):
+            await check_agreed(interaction)
+
+        item = next((child for child in self.children
+                     if getattr(child, "custom_id", None) == interaction.data.get("custom_id")), None)
+        if getattr(item, "render", False):
+            return await self._admit(interaction)
         return True
+
+    async def _admit(self, interaction: Interaction) -> bool:
+        """Puts an item whose ``render`` is ``True`` through ``cooldown`` and
+        ``admission`` like render commands."""
+        try:
+            admission.check(interaction.guild_id)
+        except Busy:
+            await send_busy(interaction)
+            return False
+
+        retry_after = cooldown.hit(interaction.user.id, interaction.guild_id)
+        if retry_after > 0:
+            await send_cooldown(interaction, retry_after)
+            return False
+
+        heavy.record(f"view:{self.related}", interaction.guild_id, interaction.user.id)
+        with tracer.span("admission"):
+            try:
+                await admission.acquire(interaction.guild_id)
+            except Busy:
+                await send_busy(interaction)
+                return False
+        interaction.extras["admitted"] = True
+        return True
+
+    async def _scheduled_task(self, item: ui.Item, interaction: Interaction) -> None:
+        # overrides a private method, so discord.py is pinned and tests/test_view.py
+        # fails when an upgrade renames it
+        # drops clicks on an item whose ``exclusive`` is ``True`` while it is running
+        if getattr(item, "exclusive", False):
+            if item in self.inflight:
+                self.logger.debug(f"[View: {self.related}] dropped a click in flight.")
+                if not interaction.response.is_done():
+                    await interaction.response.defer()
+                return
+            self.inflight.add(item)
+
+        # admission may make the click wait, so it is acknowledged first
+        if getattr(item, "render", False) and not interaction.response.is_done():
+            await interaction.response.defer()
+
+        # closes what interaction_check opened for the lag monitor, the profiler,
+        # the tracer and the ledger
+        lag.enter(f"view:{self.related}")
+        try:
+            return await super()._scheduled_task(item, interaction)
+        finally:
+            self.inflight.discard(item)
+            if interaction.extras.pop("admitted", False):
+                admission.release()
+            profiler.end()
+            lag.exit()
+            tracer.finish()
+            ledger.end()
@@ -21,7 +21,6 @@ along with this program. If not, see <https://www.gnu.org/licenses/>.
 """
 
 import logging
-from io import BytesIO
 from typing import Literal
 
 import compass
@@ -33,6 +32,9 @@ from discord.ext.commands import Bot, Context
 
 from .base import Cog, View
 from .config import config
+from .metric import metric
+from .render import render
+from .tracing import tracer
 from .translator import locale_str as _
 
 
@@ -54,6 +56,7 @@ class Card(Cog):
 
     @commands.hybrid_command(
         description = _("カードの詳細またはデッキのステータスを調べる"),
+        extras = {"render": True},
     )
     @app_commands.describe(
         cards = _("カードの名前を空白区切りで入力してね！（最大４つ）"),
@@ -61,15 +64,15 @@ class Card(Cog):
     )
     async def card(self, ctx: Context, cards: str,
                    level: Literal["20", "30", "40", "50", "60"] = "50") -> None:
-        await ctx.defer()
-
         cards = [self.data[card] for card in cards.split()[:4]]
         if len(cards) == 1:
             view = DetailView(ctx.interaction, cards[0], int(level))
         else:
             view = DeckView(ctx.interaction, cards, int(level))
+        await view.update_view()
 
-        view.message = await ctx.send(embed=view.embed, files=view.files, view=view)
+        with metric.timer("upload"), tracer.span("upload"):
+            view.message = await ctx.send(embed=view.embed, files=view.files, view=view)
         return
 
 
@@ -86,36 +89,31 @@ class DetailView(View):
         self.name = self.translator(self.card.name) + " Lv.{0}"
         self.text = _("データ提供：やぎシミュ").to(self.locale)
 
+        self.icon: File | None = None
         self.image: File | None = None
         self.message: Message | None = None
 
-        self.update_view()
-
-    @property
-    def icon(self) -> File:
-        icon = self.card.image
-        icon = icon.crop((0, 0, icon.width, icon.width))
-
-        image_bytes = BytesIO()
-        icon.save(image_bytes, "PNG", quality=100, optimize=True)
-        image_bytes.seek(0)
+        # every button renders, so they go through cooldown and admission
+        for item in self.children:
+            item.render = True
 
-        return File(fp=image_bytes, filename=f"icon.png")
 
-
-    def update_view(self) -> None:
+    async def update_view(self) -> None:
+        """Updates buttons and renders the card on the worker pool."""
         self.clear_items()
         for level in "20", "30", "40", "50", "60":
             self.add_item(getattr(self, f"level_{level}"))
         self.remove_item(getattr(self, f"level_{self.level}"))
 
-        image = self.card.generate_image(self.level, self.locale.value)
+        # users viewing the same card at the same time share the renders
+        key = ("card", self.card.name, self.level, self.locale.value)
 
-        image_bytes = BytesIO()
-        image.save(image_bytes, "PNG", quality=100, optimize=True)
-        image_bytes.seek(0)
+        icon = self.card.image
+        icon = icon.crop((0, 0, icon.width, icon.width))
+        self.icon = await render.file(icon, "icon.png", key=("icon", self.card.name))
 
-        self.image: File = File(fp=image_bytes, filename=f"image.png")
+        image = await render.shared(key, self.card.generate_image, self.level, self.locale.value)
+        self.image = await render.file(image, "image.png", key=key)
 
 
     async def on_timeout(self) -> None:
@@ -124,13 +122,15 @@ class DetailView(View):
         return await super().on_timeout()
 
     async def when_pressed(self, interaction: Interaction, level: int) -> None:
-        await interaction.response.defer()
+        if not interaction.response.is_done():
+            await interaction.response.defer()
 
         self.level = level
         self.message = interaction.message
-        self.update_view()
-        await interaction.followup.edit_message(self.message.id, embed=self.embed,
-                                                attachments=self.files, view=self)
+        await self.update_view()
+        with metric.timer("upload"), tracer.span("upload"):
+            await interaction.followup.edit_message(self.message.id, embed=self.embed,
+                                                    attachments=self.files, view=self)
 
 
     @ui.button(label="Lv.20", style=ButtonStyle.gray)
@@ -181,31 +181,33 @@ class DeckView(View):
 
         self.image: File | None = None
 
-        self.update_view()
-
         self.pointer: int = 0
         self.message: Message | None = None
 
         self.title = _("デッキ総合力").to(self.locale) + "（Lv.{0}）"
         self.text = _("データ提供：やぎシミュ").to(self.locale) + "　{0}"
 
+        # every button renders, so they go through cooldown and admission
+        for item in self.children:
+            item.render = True
 
-    def update_view(self) -> None:
-        image = self.cards.generate_deck(self.levels, self.locale.value)
-
-        image_bytes = BytesIO()
-        image.save(image_bytes, "PNG", quality=100, optimize=True)
-        image_bytes.seek(0)
 
-        self.image: File = File(fp=image_bytes, filename=f"image.png")
+    async def update_view(self) -> None:
+        """Renders the deck on the worker pool."""
+        levels = [*self.levels]
+        key = ("deck", tuple(card.name for card in self.cards), tuple(levels), self.locale.value)
+        image = await render.shared(key, self.cards.generate_deck, levels, self.locale.value)
+        self.image = await render.file(image, "image.png", key=key)
 
 
     async def when_pressed(self, interaction: Interaction) -> None:
-        await interaction.response.defer()
+        if not interaction.response.is_done():
+            await interaction.response.defer()
         self.message = interaction.message
-        self.update_view()
-        await interaction.followup.edit_message(self.message.id, embed=self.embed,
-                                                attachments=self.files, view=self)
+        await self.update_view()
+        with metric.timer("upload"), tracer.span("upload"):
+            await interaction.followup.edit_message(self.message.id, embed=self.embed,
+                                                    attachments=self.files, view=self)
 
 
     @ui.button(label="＜", style=ButtonStyle.gray)
@@ -32,6 +32,35 @@ class Config(object):
         """``bot_cps`` main color."""
         return 0x5865F2
 
+    @property
+    def log_policy(self) -> dict[str, str]:
+        """How interactions of each class are posted to the log channel.
+
+        ``full`` posts every interaction, ``sample:<rate>`` posts that
+        fraction of them, ``aggregate`` posts counts once a minute and
+        ``none`` posts nothing.
+
+        """
+        return {
+            "command": "full",
+            "context_menu": "full",
+            "view": "aggregate",
+        }
+
+    @property
+    def cooldown(self) -> dict[str, tuple[int, float]]:
+        """Cooldowns of render commands as ``(count, period)`` of each scope.
+
+        A user (or a guild) may use render commands ``count`` times in a
+        burst, and once more every ``period / count`` seconds.
+        ``count`` of 0 disables the cooldown of the scope.
+
+        """
+        return {
+            "user": (3, 15.),
+            "guild": (30, 15.),
+        }
+
 
 config = Config()
 
@@ -0,0 +1,118 @@
+"""
+A program that provides bot managed by bot_cps
+
+The GNU General Public License v3.0 (GPL-3.0)
+
+Copyright (C) 2021-present ster <ster.physics@gmail.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program. If not, see <https://www.gnu.org/licenses/>.
+
+"""
+
+__all__ = (
+    "Bucket",
+    "cooldown",
+)
+
+
+from time import monotonic, time
+from typing import Hashable
+
+from .config import config
+
+
+class Bucket(object):
+    """Token buckets of many keys, stored as one float per key (GCRA).
+
+    Each key may invoke ``count`` times in a burst, and regains one
+    invocation every ``period / count`` seconds. Keys whose bucket is full
+    again are swept every ``sweep`` seconds.
+
+    """
+
+    __slots__ = ("count", "period", "interval", "sweep", "swept", "tats")
+
+    def __init__(self, count: int, period: float, sweep: float = 60.) -> None:
+        self.count: int = count
+        self.period: float = period
+        self.interval: float = period / count
+        self.sweep: float = sweep
+        self.swept: float = monotonic()
+
+        # theoretical arrival time of the next invocation of each key
+        self.tats: dict[Hashable, float] = {}
+
+    def __len__(self) -> int:
+        return len(self.tats)
+
+    def retry_after(self, key: Hashable, now: float) -> float:
+        """Obtains seconds until ``key`` may invoke, 0 if it may now."""
+        tat = max(self.tats.get(key, now), now)
+        return max(tat - (self.period - self.interval) - now, 0.)
+
+    def take(self, key: Hashable, now: float) -> None:
+        """Consumes an invocation of ``key``."""
+        self.tats[key] = max(self.tats.get(key, now), now) + self.interval
+
+        if now - self.swept >= self.sweep:
+            self.swept = now
+            self.tats = {key: tat for key, tat in self.tats.items() if tat > now}
+
+
+class Cooldown(object):
+    """Cooldowns of render commands per user and per guild.
+
+    ``policy`` maps ``user`` and ``guild`` to ``(count, period)``; see
+    ``config.cooldown``. ``inflight`` holds commands of each user still
+    running, so that a repeated command can be dropped.
+
+    """
+
+    def __init__(self) -> None:
+        self.buckets: dict[str, Bucket] = {}
+        self.inflight: set[tuple[int, str]] = set()
+        self.configure(config.cooldown)
+
+    def configure(self, policy: dict[str, tuple[int, float]]) -> None:
+        self.buckets = {scope: Bucket(count, period) for scope, (count, period) in policy.items()
+                        if count > 0}
+
+    def hit(self, user_id: int, guild_id: int | None) -> float:
+        """Consumes an invocation, or obtains seconds to wait if on cooldown.
+
+        The guild scope does not apply when ``guild_id`` is ``None``, so that
+        direct messages do not share one bucket.
+
+        """
+        now = monotonic()
+        keys = {"user": user_id, "guild": guild_id}
+        buckets = [(keys[scope], bucket) for scope, bucket in self.buckets.items()
+                   if keys[scope] is not None]
+
+        retry_after = max((bucket.retry_after(key, now) for key, bucket in buckets), default=0.)
+        if retry_after > 0:
+            return retry_after
+
+        for key, bucket in buckets:
+            bucket.take(key, now)
+        return 0.
+
+    def until(self, retry_after: float) -> int:
+        """Obtains epoch seconds at which the command may be used again."""
+        return int(time() + retry_after) + 1
+
+
+cooldown = Cooldown()
+
+del Cooldown
@@ -21,19 +21,22 @@ along with this program. If not, see <https://www.gnu.org/licenses/>.
 """
 
 import logging
-from collections import UserDict
-from io import BytesIO
+from asyncio import gather
 from random import choice, sample, shuffle
 from typing import Literal
 
 from compass import Attribute, CardData, Rarity
-from discord import ButtonStyle, Embed, File, Interaction, Locale, ui
+from discord import ButtonStyle, Embed, Interaction, Locale, app_commands, ui
 from discord.ext import commands
 from discord.ext.commands import Bot, Context
 from discord.interactions import Interaction
 
 from .base import Cog, View
 from .config import config
+from .metric import metric
+from .render import render
+from .setting import SettingStore
+from .tracing import tracer
 from .translator import locale_str as _
 
 
@@ -54,134 +57,179 @@ data: CardData = CardData()
 class Deck(Cog):
     def __init__(self, bot: Bot) -> None:
         super().__init__(bot, logger)
-        self.user_argument: dict[int, Argument] = {}
+        self.settings = SettingStore("deck", Argument().mask)
+
+    async def cog_unload(self) -> None:
+        await super().cog_unload()
+        await self.settings.close()
+        return
 
     @commands.hybrid_command(
         description = _("ランダムなデッキを生成する"),
+        extras = {"render": True},
+    )
+    @app_commands.describe(
+        count = _("生成するデッキの数を指定してね！"),
     )
-    async def deck(self, ctx: Context) -> None:
-        argument = self.user_argument.get(ctx.author.id, Argument())
-        await argument.send_deck(ctx.interaction)
-        self.user_argument[ctx.author.id] = argument
+    async def deck(self, ctx: Context, count: app_commands.Range[int, 1, 5] = 1) -> None:
+        argument = Argument(await self.settings.get(ctx.author.id))
+        await argument.send_deck(ctx.interaction, count)
         return
 
     @commands.hybrid_command(
         name = "deck-setting",
         description = _("デッキの設定"),
+        extras = {"ephemeral": True},
     )
     async def deck_setting(self, ctx: Context) -> None:
-        await ctx.defer(ephemeral=True)
-
-        argument = self.user_argument.get(ctx.author.id, Argument())
-        view = DeckView(ctx.interaction, argument)
+        argument = Argument(await self.settings.get(ctx.author.id))
+        view = DeckView(ctx.interaction, argument, self.settings)
         await ctx.send(view=view, ephemeral=True)
-        self.user_argument[ctx.author.id] = argument
 
 
-class Argument(UserDict):
-    def __init__(self) -> None:
-        super().__init__()
-        self.data: dict[Literal["balance", "random", \
-                                "season", "normal", "collabo"] | Attribute | Rarity, bool]
-        self.data.update({"balance": True, "random": False,})
-        self.data.update({"season": False, "normal": True, "collabo": True})
-        self.data.update({attribute: True for attribute in Attribute})
-        self.data.update({rarity: False for rarity in Rarity})
-        self.data[Rarity.UR] = True
+Key = Literal["balance", "random", "season", "normal", "collabo"] | Attribute | Rarity
+Role = Literal["off", "def", "sup", "rec"]
+
+# bit assigned to each key of ``Argument``
+_BITS: dict[Key, int] = {key: 1 << idx for idx, key in enumerate(
+    ["balance", "random", "season", "normal", "collabo", *Attribute, *Rarity])}
+
+_MODE = _BITS["balance"] | _BITS["random"]
+_SOURCE = _BITS["season"] | _BITS["normal"] | _BITS["collabo"]
+_ATTRIBUTE = sum(_BITS[attribute] for attribute in Attribute)
+_RARITY = sum(_BITS[rarity] for rarity in Rarity)
+
+_DEFAULT = _BITS["balance"] | _BITS["normal"] | _BITS["collabo"] | _ATTRIBUTE | _BITS[Rarity.UR]
+
+# patterns used when the pool has no recovery cards
+_PATTERNS: list[tuple[Role, ...]] = [
+    ("off","def","def","def"), ("off","off","def","def"), ("off","off","off","def"),
+    ("off","def","def","sup"), ("def","def","sup","sup"), ("def","def","def","sup"),
+]
+
+# patterns used when the pool has recovery cards
+_PATTERNS_REC: list[tuple[Role, ...]] = [
+    ("off","off","def","rec"), ("off","def","def","rec"), ("off","def","rec","rec"),
+    ("off","sup","def","rec"), ("sup","sup","def","rec"), ("sup","def","def","rec"),
+    ("off","off","def","def"), ("off","def","def","def"),
+]
+
+
+class Pool(object):
+    """Candidate cards for a filter, divided by role once."""
+
+    __slots__ = ("cards", "divided", "patterns")
+
+    def __init__(self, cards: CardData) -> None:
+        self.cards: CardData = cards
+        self.divided: dict[Role, CardData] = cards.divide()
+
+        preferred = _PATTERNS_REC if self.divided["rec"] != [] else _PATTERNS
+
+        # falls back to any pattern so that a deck is generated whenever possible
+        self.patterns: list[tuple[Role, ...]] = [pattern for pattern in preferred
+                                                  if self.feasible(pattern)] \
+                                             or [pattern for pattern in _PATTERNS + _PATTERNS_REC
+                                                 if self.feasible(pattern)]
+
+    def feasible(self, pattern: tuple[Role, ...]) -> bool:
+        """Checks that the pool has enough cards for ``pattern``."""
+        return all(pattern.count(role) <= len(self.divided[role]) for role in set(pattern))
+
+    def balance(self) -> CardData | None:
+        """Samples a balanced deck, or returns ``None`` if impossible."""
+        if self.patterns == []:
+            return None
+
+        pattern = choice(self.patterns)
+        cards = []
+        for role in set(pattern):
+            each_pool = self.divided[role]
+            cards.extend(each_pool[idx] for idx in sample(range(len(each_pool)), pattern.count(role)))
+
+        shuffle(cards)
+        return CardData(cards)
+
+    def random(self) -> CardData | None:
+        """Samples a random deck, or returns ``None`` if impossible."""
+        if len(self.cards) < 4:
+            return None
+        return CardData([self.cards[idx] for idx in sample(range(len(self.cards)), 4)])
+
+
+# pools for each filter mask, filled lazily
+_pools: dict[int, Pool] = {}
+
+
+def get_pool(argument: "Argument") -> Pool:
+    """Obtains the ``Pool`` for the filter of ``argument``."""
+    key = argument.mask & ~_MODE
+    if key not in _pools:
+        _pools[key] = Pool(data.get_cards(*argument.args, **argument.kwargs))
+    return _pools[key]
+
+
+class Argument(object):
+    """Deck setting encoded as a bitmask."""
+
+    __slots__ = ("mask",)
+
+    def __init__(self, mask: int = _DEFAULT) -> None:
+        self.mask: int = mask
+
+    def __getitem__(self, key: Key) -> bool:
+        return bool(self.mask & _BITS[key])
 
     def __bool__(self) -> bool:
         """Checks that this is legal parameter."""
-        flag1 = self.data["season"] or self.data["normal"] or self.data["collabo"]
-        flag2, flag3 = False, False
-        for attribute in Attribute:
-            flag2 |= self.data[attribute]
-        for rarity in Rarity:
-            flag3 |= self.data[rarity]
-        return flag1 and flag2 and flag3
+        return bool(self.mask & _SOURCE and self.mask & _ATTRIBUTE and self.mask & _RARITY)
 
 
-    def update(self, key: Literal["balance", "random", \
-                                  "season", "normal", "collabo"] | Attribute | Rarity) -> None:
+    def update(self, key: Key) -> None:
         if key in ["balance", "random"]:
-            self.data["balance"] = not self.data["balance"]
-            self.data["random"] = not self.data["random"]
+            self.mask ^= _MODE
         else:
-            self.data[key] = not self.data[key]
+            self.mask ^= _BITS[key]
             if not bool(self):
-                self.data[key] = not self.data[key]
+                self.mask ^= _BITS[key]
         return
 
 
     @property
     def args(self) -> tuple[Attribute | Rarity]:
         """Obtains ``compass.CardData.get_cards`` arguments."""
-        retval = []
-        for attribute in Attribute:
-            if self.data[attribute]:
-                retval.append(attribute)
-        for rarity in Rarity:
-            if self.data[rarity]:
-                retval.append(rarity)
-        return tuple(retval)
+        return tuple(key for key in [*Attribute, *Rarity] if self[key])
 
     @property
     def kwargs(self) -> dict[Literal["season", "normal", "collabo"], bool]:
         """Obtains ``compass.CardData.get_cards`` keyword arguments."""
         return {
-            "season": self.data["season"],
-            "normal": self.data["normal"],
-            "collabo": self.data["collabo"],
+            "season": self["season"],
+            "normal": self["normal"],
+            "collabo": self["collabo"],
         }
 
 
-    async def send_deck(self, interaction: Interaction) -> None:
-        """Generates deck ``discord.Embed`` from this and sends its."""
-
-        await interaction.response.defer()
-
-        pool: CardData = data.get_cards(*self.args, **self.kwargs)
-
-        if self.data["random"]:
-            cards = CardData(sample(pool, k=4))
-        else: # self.data["balance"] == True
-            divided_pool: dict[Literal["off", "def", "sup", "rec"], CardData] = pool.divide()
-
-            for each_pool in divided_pool.values():
-                shuffle(each_pool)
+    async def send_deck(self, interaction: Interaction, count: int = 1) -> None:
+        """Generates ``count`` decks ``discord.Embed`` from this and sends its."""
 
-            if divided_pool["rec"] == []:
-                patterns = [["off","def","def","def"],["off","off","def","def"],
-                            ["off","off","off","def"],["off","def","def","sup"],
-                            ["def","def","sup","sup"],["def","def","def","sup"],]
-            else:
-                patterns = [["off","off","def","rec"],["off","def","def","rec"],
-                            ["off","def","rec","rec"],["off","sup","def","rec"],
-                            ["sup","sup","def","rec"],["sup","def","def","rec"],
-                            ["off","off","def","def"],["off","def","def","def"],]
-
-            pattern = choice(patterns)
-            shuffle(pattern)
-
-            cards = []
-            for type_ in pattern:
-                if divided_pool[type_] != []:
-                    cards.append(divided_pool[type_].pop())
-
-            cards = CardData(cards)
-
-            if len(cards) != 4:
-                content = _("その条件ではデッキを生成できません").to(interaction.locale)
-                await interaction.followup.send(content=content)
-                return
+        if not interaction.response.is_done():
+            await interaction.response.defer()
 
-        img = cards.generate_deck(locale=interaction.locale.value)
+        with tracer.span("pool", count=count):
+            pool = get_pool(self)
+            decks = [pool.random() if self["random"] else pool.balance() for idx in range(count)]
 
-        image_bytes = BytesIO()
-        img.save(image_bytes, "PNG", quality=100, optimize=True)
-        image_bytes.seek(0)
+        if None in decks:
+            content = _("その条件ではデッキを生成できません").to(interaction.locale)
+            await interaction.followup.send(content=content)
+            return
 
-        file = File(fp=image_bytes, filename=f"{interaction.user.id}.png")
+        images = await gather(*[render.run(cards.generate_deck, locale=interaction.locale.value)
+                                for cards in decks])
+        img = images[0] if count == 1 else await render.run(render.composite, images, 16)
 
+        file = await render.file(img, f"{interaction.user.id}.png")
 
         title = _("デッキ総合力（Lv.200）").to(interaction.locale)
         embed = Embed(title=title, color=config.color)
@@ -191,15 +239,15 @@ class Argument(UserDict):
         embed.set_footer(text=text,
                             icon_url="http://yagitools.html.xdomain.jp/compas-deck/img/bg_credit.png")
 
-        if not interaction.response.is_done():
-            await interaction.response.send_message(embed=embed, file=file)
-        else:
-            await interaction.followup.send(embed=embed, file=file)
+        with metric.timer("upload"), tracer.span("upload"):
+            if not interaction.response.is_done():
+                await interaction.response.send_message(embed=embed, file=file)
+            else:
+                await interaction.followup.send(embed=embed, file=file)
 
 
 class ArgumentButton(ui.Button):
-    def __init__(self, key: Literal["balance", "random", \
-                                    "season", "normal", "collabo"] | Attribute | Rarity,
+    def __init__(self, key: Key,
                  label: str, style: ButtonStyle, row: int) -> None:
         super().__init__()
 
@@ -215,6 +263,7 @@ class ArgumentButton(ui.Button):
     async def callback(self, interaction: Interaction) -> None:
         await interaction.response.defer()
         self.view.argument.update(self.key)
+        self.view.save()
         self.view.update_style()
         await interaction.followup.edit_message(interaction.message.id, view=self.view)
 
@@ -231,10 +280,16 @@ class ResetButton(ui.Button):
     async def callback(self, interaction: Interaction) -> None:
         await interaction.response.defer()
         self.view.argument.__init__()
+        self.view.save()
         self.view.update_style()
         await interaction.followup.edit_message(interaction.message.id, view=self.view)
 
 class ExecuteButton(ui.Button):
+    # double clicks are dropped while running
+    exclusive = True
+    # goes through cooldown and admission like render commands
+    render = True
+
     def __init__(self, locale: Locale) -> None:
         super().__init__()
 
@@ -249,10 +304,12 @@ class ExecuteButton(ui.Button):
 
 
 class DeckView(View):
-    def __init__(self, interaction: Interaction, argument: Argument):
+    def __init__(self, interaction: Interaction, argument: Argument, settings: SettingStore):
         super().__init__("deck", 600, logger)
         self.locale: Locale = interaction.locale
         self.argument: Argument = argument
+        self.settings: SettingStore = settings
+        self.user_id: int = interaction.user.id
 
         for key, label, style, row in [
             ("normal", _("恒常").to(self.locale), ButtonStyle.blurple, 0,),
@@ -276,6 +333,10 @@ class DeckView(View):
         self.update_style()
 
 
+    def save(self) -> None:
+        """Stores the current setting of the user."""
+        self.settings[self.user_id] = self.argument.mask
+
     def update_style(self) -> None:
         """Updates all buttons style."""
 
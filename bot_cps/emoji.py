@@ -20,19 +20,22 @@ along with this program. If not, see <https://www.gnu.org/licenses/>.
 
 """
 
-import json
 import logging
-from io import BytesIO
+from asyncio import Semaphore, create_task, gather, sleep
+from time import perf_counter
+from typing import Awaitable, Callable
 
 import discord
 from compass import HeroData
-from discord import ButtonStyle, Interaction, PartialEmoji, ui
+from discord import (ButtonStyle, Guild, HTTPException, Interaction,
+                     PartialEmoji, RateLimited, app_commands, ui)
 from discord.ext import commands
 from discord.ext.commands import Bot, Context
-from PIL.PngImagePlugin import PngImageFile
+from PIL.Image import Image
 
+from .asset import asset
 from .base import Cog, View
-from .path import path
+from .render import render
 from .translator import locale_str as _
 
 
@@ -47,20 +50,155 @@ async def teardown(bot: Bot) -> None:
     await bot.remove_cog("Emoji")
 
 
+# Discord rejects emoji images larger than this
+MAX_EMOJI_SIZE = 256 * 1024
+
+# Discord shows emojis at most at this size
+EMOJI_PIXELS = 128
+
+
+class IconIndex(object):
+    """Hero icons indexed by emoji name, with PNG payloads for emojis."""
+
+    def __init__(self) -> None:
+        self.heroes = {str(hero): hero for hero in HeroData()}
+        self.payloads: dict[str, bytes] = {}
+
+    def payload(self, name: str) -> bytes:
+        """Obtains the emoji payload of the hero, encoding it on first use."""
+        if name not in self.payloads:
+            self.payloads[name] = self.encode(self.heroes[name].icon)
+        return self.payloads[name]
+
+    def prepare(self) -> None:
+        """Encodes payloads of all heroes."""
+        for name in self.heroes:
+            self.payload(name)
+
+    @staticmethod
+    def encode(img: Image) -> bytes:
+        """Encodes ``img`` to PNG small enough to be an emoji."""
+        img = img.copy()
+        img.thumbnail((EMOJI_PIXELS, EMOJI_PIXELS))
+        while True:
+            payload = render.encode(img).getvalue()
+            if len(payload) <= MAX_EMOJI_SIZE:
+                return payload
+            img = img.resize((img.width * 3 // 4, img.height * 3 // 4))
+
+
+icon_index = IconIndex()
+
+
+class Installer(object):
+    """Creates custom emojis in a guild on a rate-limit aware schedule.
+
+    ```python
+    installer = Installer(guild, emojis, reason)
+    await installer.run(on_progress)
+    ```
+
+    """
+
+    def __init__(self, guild: Guild, emojis: list[PartialEmoji], reason: str,
+                 concurrency: int = 2, interval: float = 2.0) -> None:
+        """Constructor of this class.
+
+        Parameters
+        ----------
+        guild: :class:`discord.Guild`
+            Guild to which emojis are added.
+        emojis: List[:class:`discord.PartialEmoji`]
+            Emojis to be added.
+        reason: :class:`str`
+            Reason shown in the audit log.
+        concurrency: :class:`int`
+            Maximum number of creations in flight.
+        interval: :class:`float`
+            Minimum seconds between progress updates.
+
+        """
+        self.guild: Guild = guild
+        self.emojis: list[PartialEmoji] = emojis
+        self.reason: str = reason
+        self.semaphore = Semaphore(concurrency)
+        self.interval: float = interval
+
+        # static emoji slots left in the guild
+        self.slots: int = guild.emoji_limit - sum(not emoji.animated for emoji in guild.emojis)
+
+        self.created: int = 0
+        self.failed: int = 0
+        self.elapsed: float = 0.
+
+    @property
+    def done(self) -> int:
+        return self.created + self.failed
+
+    async def create(self, emoji: PartialEmoji) -> bool:
+        """Creates ``emoji``, waiting out rate limits."""
+        image = await render.run(icon_index.payload, emoji.name)
+        while True:
+            try:
+                await self.guild.create_custom_emoji(name=emoji.name, image=image,
+                                                     reason=self.reason)
+                return True
+            except RateLimited as e:
+                await sleep(e.retry_after)
+            except HTTPException as e:
+                if e.status != 429:
+                    return False
+                await sleep(float(e.response.headers.get("Retry-After", 1)))
+
+    async def run(self, on_progress: Callable[["Installer"], Awaitable[None]]) -> None:
+        """Creates all emojis, calling ``on_progress`` at most once per ``interval``."""
+        start = last = perf_counter()
+        emojis = self.emojis[:max(self.slots, 0)]
+        self.failed += len(self.emojis) - len(emojis)
+
+        async def worker(emoji: PartialEmoji) -> None:
+            nonlocal last
+            async with self.semaphore:
+                if await self.create(emoji):
+                    self.created += 1
+                else:
+                    self.failed += 1
+            if perf_counter() - last >= self.interval:
+                last = perf_counter()
+                self.elapsed = last - start
+                await on_progress(self)
+
+        tasks = [create_task(worker(emoji)) for emoji in emojis]
+        try:
+            await gather(*tasks)
+        finally:
+            # the rest must not keep creating emojis once one has failed
+            for task in tasks:
+                task.cancel()
+            await gather(*tasks, return_exceptions=True)
+
+        self.elapsed = perf_counter() - start
+        await on_progress(self)
+
+
 class Emoji(Cog):
     def __init__(self, bot: Bot) -> None:
         super().__init__(bot, logger)
-        with open(path.emoji_json, "r") as f:
-            data = json.load(f)["hero"]
+        data = asset.emoji["hero"]
 
         self.emojis = [PartialEmoji.from_str(data[key]) for key in data]
+        self.installing: set[int] = set()
+
+    async def run_once_when_ready(self) -> None:
+        await render.run(icon_index.prepare)
 
     @commands.hybrid_command(
         description = _("コンパスのアイコンを絵文字として追加する"),
     )
-    async def emoji(self, ctx: Context) -> None:
-        await ctx.defer()
-
+    @app_commands.describe(
+        bulk = _("足りない絵文字をまとめて追加するか選んでね！"),
+    )
+    async def emoji(self, ctx: Context, bulk: bool = False) -> None:
         if not hasattr(self, "emojis"):
             content = _("追加できる絵文字はないよ！").to(ctx.interaction.locale)
             await ctx.send(content=content, ephemeral=True)
@@ -71,58 +209,77 @@ class Emoji(Cog):
             await ctx.send(content=content, ephemeral=True)
             return
 
-        emojis = []
-        guild_emojis = ctx.guild.emojis
-
-        for emoji in self.emojis:
-            flag = False
-            for g_emoji in guild_emojis:
-                if emoji.name == g_emoji.name:
-                    flag = True
-            if not flag:
-                emojis.append(emoji)
+        guild_emojis = {emoji.name for emoji in ctx.guild.emojis}
+        emojis = [emoji for emoji in self.emojis if emoji.name not in guild_emojis]
 
         if len(emojis) == 0:
             content = _("追加できる絵文字はないよ！").to(ctx.interaction.locale)
             await ctx.send(content=content, ephemeral=True)
+        elif bulk:
+            await self.install(ctx, emojis)
         else:
             await ctx.send(view=EmojiView(emojis), ephemeral=True)
         return
 
+    async def install(self, ctx: Context, emojis: list[PartialEmoji]) -> None:
+        """Adds all ``emojis`` to the guild, showing progress in one message."""
+        locale = ctx.interaction.locale
+
+        if ctx.guild.id in self.installing:
+            content = _("絵文字を追加している途中だよ！").to(locale)
+            await ctx.send(content=content, ephemeral=True)
+            return
+
+        reason = _("{0} の実行した /emoji コマンドにより追加").to(locale).format(ctx.author)
+        installer = Installer(ctx.guild, emojis, reason)
+        text = _("絵文字を追加中… {0}/{1}（失敗：{2}）").to(locale)
+
+        message = await ctx.send(content=text.format(0, len(emojis), 0))
+
+        async def on_progress(installer: Installer) -> None:
+            content = text.format(installer.done, len(emojis), installer.failed)
+            try:
+                await message.edit(content=content)
+            except HTTPException as e:
+                # the interaction token expires long before a large install ends
+                self.logger.warning(f"Failed to show the progress in {ctx.guild.id}: {e}")
+
+        self.installing.add(ctx.guild.id)
+        try:
+            await installer.run(on_progress)
+        finally:
+            self.installing.discard(ctx.guild.id)
+
+        self.logger.info(f"Added {installer.created} emojis to {ctx.guild.id}"
+                         f" in {installer.elapsed:.1f}s ({installer.failed} failed).")
+        return
+
 class EmojiButton(ui.Button):
     def __init__(self, emoji: discord.PartialEmoji) -> None:
         super().__init__()
         self.style = ButtonStyle.gray
         self.emoji = emoji
 
-    def get_icon(self) -> PngImageFile:
-        """Obtains icon image from partial emoji."""
-
-        hd = HeroData()
-        for hero in hd:
-            if self.emoji.name ==str(hero):
-                return hero.icon
-
     async def callback(self, interaction: Interaction) -> None:
         await interaction.response.defer()
 
-        try:
-            self.disabled = True
-
-            img = self.get_icon()
-
-            image_bytes = BytesIO()
-            img.save(image_bytes, "PNG", quality=100, optimize=True)
-            image_bytes.seek(0)
+        start = perf_counter()
+        self.disabled = True
 
-            image = image_bytes.read()
+        image = await render.run(icon_index.payload, self.emoji.name)
 
-            reason = _("{0} の実行した /emoji コマンドにより追加").to(interaction.locale)
-            reason = reason.format(interaction.user)
+        reason = _("{0} の実行した /emoji コマンドにより追加").to(interaction.locale)
+        reason = reason.format(interaction.user)
+        try:
             await interaction.guild.create_custom_emoji(name=self.emoji.name, image=image,
                                                         reason=reason)
-        except:
-            pass
+        except HTTPException as e:
+            # e.g. no emoji slots left or missing the permission
+            self.view.logger.warning(f"Failed to add emoji {self.emoji.name}"
+                                     f" to {interaction.guild_id}: {e}")
+        else:
+            self.view.logger.info(f"Added emoji {self.emoji.name} to {interaction.guild_id}"
+                                  f" in {perf_counter() - start:.1f}s.")
 
         await interaction.followup.edit_message(interaction.message.id, view=self.view)
         return
@@ -21,6 +21,8 @@ along with this program. If not, see <https://www.gnu.org/licenses/>.
 """
 
 __all__ = (
+    "Busy",
+    "CoolingDown",
     "NotAgreed",
 )
 
@@ -32,3 +34,15 @@ class NotAgreed(DiscordException):
     """Raises when the user does not agree to the Terms of Service."""
     def __init__(self, *args: object) -> None:
         super().__init__(*args)
+
+
+class Busy(DiscordException):
+    """Raises when the bot is too busy to accept a command."""
+    def __init__(self, *args: object) -> None:
+        super().__init__(*args)
+
+
+class CoolingDown(DiscordException):
+    """Raises when the user or the guild is on cooldown."""
+    def __init__(self, *args: object) -> None:
+        super().__init__(*args)
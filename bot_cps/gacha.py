@@ -20,18 +20,21 @@ along with this program. If not, see <https://www.gnu.org/licenses/>.
 
 """
 
-import json
 import logging
-from io import BytesIO
+from collections import Counter
 from random import choices, shuffle
 
 from compass import Attribute, CardData, Rarity
-from discord import File, app_commands
+from discord import Embed, app_commands
 from discord.ext import commands
 from discord.ext.commands import Bot, Context
 
+from .asset import asset
 from .base import Cog
-from .path import path
+from .config import config
+from .metric import metric
+from .render import render
+from .tracing import tracer
 from .translator import locale_str as _
 
 
@@ -47,8 +50,7 @@ async def teardown(bot: Bot) -> None:
 
 
 # prepares choices for name argument
-with open(path.gacha_json, "r") as f:
-    gacha_data = json.load(f)
+gacha_data = asset.gacha
 
 gacha_list = [app_commands.Choice(name=_(data["name"]), value=idx)
               for idx, data in enumerate(gacha_data)]
@@ -58,42 +60,85 @@ class Gacha(Cog):
     def __init__(self, bot: Bot) -> None:
         super().__init__(bot, logger)
         self.data = CardData()
+        self.populations: dict[int, dict[str, tuple[CardData, list[float]]]] = {}
 
     @commands.hybrid_command(
         description = _("ガチャシミュレーター"),
+        extras = {"render": True},
     )
     @app_commands.describe(
         name = _("シミュレートするガチャの名前を指定してね！"),
+        times = _("ガチャを引く回数を指定してね！"),
     )
     @app_commands.choices(name=gacha_list)
-    async def gacha(self, ctx: Context, name: int) -> None:
-        await ctx.defer()
-
+    async def gacha(self, ctx: Context, name: int,
+                    times: app_commands.Range[int, 1, 10] = 1) -> None:
         data = gacha_data[name]
-        cards = CardData([])
+        with tracer.span("draw", times=times):
+            cards = self.draw(name, data["k"] * times)
+
+        if times == 1:
+            cards = CardData(sorted(cards, key=lambda card: card.rarity))
+            img = await render.run(cards.generate_large_image)
+            file = await render.file(img, f"{ctx.author.id}.png")
+            with metric.timer("upload"), tracer.span("upload"):
+                await ctx.send(file=file)
+            return
+
+        # summarises all rolls instead of rendering every set
+        rarities = [*data["weight"]]
+        counter = Counter(card.rarity for card in cards)
+
+        title = _("{0}（{1}回）").to(ctx.interaction.locale)
+        description = "　".join(f"{rarity}: `{counter[Rarity(rarity)]}`" for rarity in rarities)
+        embed = Embed(title=title.format(_(data["name"]).to(ctx.interaction.locale), times),
+                      description=description, color=config.color)
+
+        highlights = [card for card in cards if card.rarity == Rarity(rarities[0])]
+        if highlights == []:
+            await ctx.send(embed=embed)
+            return
+
+        highlights = CardData(sorted(highlights, key=lambda card: card.rarity))
+        img = await render.run(highlights.generate_large_image)
+        file = await render.file(img, f"{ctx.author.id}.png")
+        embed.set_image(url=f"attachment://{file.filename}")
+        with metric.timer("upload"), tracer.span("upload"):
+            await ctx.send(embed=embed, file=file)
+        return
 
-        rarities = choices([*data["weight"]], [*data["weight"].values()], k=data["k"])
+    def population(self, name: int) -> dict[str, tuple[CardData, list[float]]]:
+        """Obtains population and weights of each rarity for the gacha."""
+        if name in self.populations:
+            return self.populations[name]
+
+        data = gacha_data[name]
+        populations = {}
 
         for rarity in [*data["weight"]]:
             population = CardData([])
             weights = []
-            k = sum(el==rarity for el in rarities)
             for condition in data[rarity]:
                 args = list(map(lambda el: Attribute(el), condition["attributes"])) \
                      + list(map(lambda el: Rarity(el), condition["rarities"]))
                 tmp = self.data.get_cards(*args, **condition["kwargs"], themes=condition["themes"])
                 population.extend(tmp)
                 weights.extend([condition["weight"]]*len(tmp))
-            cards.extend(choices(population, weights, k=k))
+            populations[rarity] = (population, weights)
 
-        shuffle(cards)
-        cards = CardData(sorted(cards, key=lambda card: card.rarity))
+        self.populations[name] = populations
+        return populations
 
-        img = cards.generate_large_image()
+    def draw(self, name: int, k: int) -> CardData:
+        """Draws ``k`` cards at once from the gacha."""
+        data = gacha_data[name]
+        cards = CardData([])
 
-        image_bytes = BytesIO()
-        img.save(image_bytes, "PNG", quality=100, optimize=True)
-        image_bytes.seek(0)
+        rarities = choices([*data["weight"]], [*data["weight"].values()], k=k)
 
-        await ctx.send(file=File(fp=image_bytes, filename=f"{ctx.author.id}.png"))
-        return
+        for rarity, (population, weights) in self.population(name).items():
+            number = sum(el==rarity for el in rarities)
+            cards.extend(choices(population, weights, k=number))
+
+        shuffle(cards)
+        return cards
@@ -0,0 +1,180 @@
+"""
+A program that provides bot managed by bot_cps
+
+The GNU General Public License v3.0 (GPL-3.0)
+
+Copyright (C) 2021-present ster <ster.physics@gmail.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program. If not, see <https://www.gnu.org/licenses/>.
+
+"""
+
+__all__ = (
+    "HealthServer",
+)
+
+
+import logging
+from math import isfinite
+
+from aiohttp import web
+from discord.ext.commands import Bot
+
+from .accounting import ledger
+from .admission import admission
+from .base import live_views
+from .cooldown import cooldown
+from .heavy import heavy
+from .lag import lag
+from .metric import metric
+from .render import render
+from .setting import SettingStore
+from .sink import get_sink
+from .translator import _get_translator
+
+
+logger = logging.getLogger(__name__)
+
+
+class HealthServer(object):
+    """Serves health probes and metrics of the bot on localhost.
+
+    ``/healthz``
+        Always ``200`` while the event loop is serving requests.
+    ``/readyz``
+        ``200`` once the bot is ready and every cog has finished
+        ``run_once_when_ready``, ``503`` before that.
+    ``/metrics``
+        Metrics in the Prometheus text format.
+
+    """
+
+    def __init__(self, bot: Bot, port: int, host: str = "127.0.0.1") -> None:
+        self.bot: Bot = bot
+        self.port: int = port
+        self.host: str = host
+
+        app = web.Application()
+        app.router.add_get("/healthz", self.healthz)
+        app.router.add_get("/readyz", self.readyz)
+        app.router.add_get("/metrics", self.metrics)
+        self.runner = web.AppRunner(app, access_log=None)
+
+    async def start(self) -> None:
+        await self.runner.setup()
+        await web.TCPSite(self.runner, self.host, self.port).start()
+        logger.info(f"Health server is listening on {self.host}:{self.port}.")
+        return
+
+    async def close(self) -> None:
+        await self.runner.cleanup()
+        return
+
+    @property
+    def ready(self) -> bool:
+        return self.bot.is_ready() \
+            and all(getattr(cog, "ready", True) for cog in self.bot.cogs.values())
+
+    async def healthz(self, request: web.Request) -> web.Response:
+        return web.Response(text="ok")
+
+    async def readyz(self, request: web.Request) -> web.Response:
+        if self.ready:
+            return web.Response(text="ready")
+        return web.Response(text="not ready", status=503)
+
+    async def metrics(self, request: web.Request) -> web.Response:
+        return web.Response(text="".join(self.collect()),
+                            content_type="text/plain", charset="utf-8")
+
+    def collect(self) -> list[str]:
+        """Obtains lines of all metrics in the Prometheus text format."""
+        lines: list[str] = []
+
+        def add(name: str, kind: str, help: str, samples: dict[str, float]) -> None:
+            lines.append(f"# HELP bot_cps_{name} {help}\n")
+            lines.append(f"# TYPE bot_cps_{name} {kind}\n")
+            for labels, value in samples.items():
+                lines.append(f"bot_cps_{name}{labels} {value}\n")
+
+        latency = self.bot.latency
+        add("up", "gauge", "Whether the bot is ready.", {"": int(self.ready)})
+        add("guilds", "gauge", "Number of guilds.", {"": len(self.bot.guilds)})
+        add("gateway_latency_seconds", "gauge", "Latency of the gateway heartbeat.",
+            {"": latency if isfinite(latency) else "NaN"})
+        add("loop_lag_seconds", "gauge", "Lag of the last event loop heartbeat.",
+            {"": max(lag.lag, 0.)})
+        add("loop_stalls_total", "counter", "Event loop stalls over the threshold.",
+            {f'{{name="{offender.name}"}}': offender.count for offender in lag.offenders.values()})
+        add("render_queue_depth", "gauge", "Render jobs submitted and not finished.",
+            {"": render.depth})
+        add("admission_active", "gauge", "Render commands running.", {"": admission.active})
+        add("admission_waiting", "gauge", "Render commands waiting for a slot.",
+            {"": admission.waiting})
+        add("admission_shed_total", "counter", "Render commands shed as busy.",
+            {"": admission.shed})
+        add("cooldown_keys", "gauge", "Users and guilds tracked by cooldowns.",
+            {f'{{scope="{scope}"}}': len(bucket) for scope, bucket in cooldown.buckets.items()})
+        add("live_views", "gauge", "Views still accepting input.", {"": live_views()})
+
+        info = _get_translator.cache_info()
+        caches = {"translator": (info.hits, info.misses)}
+        for cog in self.bot.cogs.values():
+            settings = getattr(cog, "settings", None)
+            if isinstance(settings, SettingStore):
+                caches[f"setting_{cog.qualified_name.lower()}"] = (settings.hits, settings.misses)
+        add("cache_hits_total", "counter", "Cache hits.",
+            {f'{{cache="{cache}"}}': hits for cache, (hits, misses) in caches.items()})
+        add("cache_misses_total", "counter", "Cache misses.",
+            {f'{{cache="{cache}"}}': misses for cache, (hits, misses) in caches.items()})
+
+        sink = get_sink(self.bot)
+        if sink is not None:
+            add("log_queue_depth", "gauge", "Logs waiting to be sent.", {"": sink.depth})
+            add("logs_dropped_total", "counter", "Logs dropped.", {"": sink.dropped})
+
+        add("invocations_total", "counter", "Invocations of commands and views.",
+            {f'{{command="{command}"}}': count for command, count in metric.invocations.items()})
+
+        for name, key, help in (("cpu_seconds_total", "cpu", "CPU seconds in render workers."),
+                                ("encoded_bytes_total", "encoded", "Bytes of encoded images."),
+                                ("uploaded_bytes_total", "uploaded", "Bytes of uploaded files."),
+                                ("rest_calls_total", "rest", "REST requests.")):
+            add(name, "counter", help,
+                {f'{{command="{command}"}}': getattr(usage, key)
+                 for command, usage in ledger.commands.items()})
+
+        samples = {}
+        for kind, hitters in ("guild", heavy.guilds), ("user", heavy.users):
+            for key, cost in hitters.top():
+                samples[f'{{kind="{kind}",id="{key}"}}'] = cost
+        add("heavy_hitter_cost_seconds", "gauge",
+            "Estimated render cost of the heaviest guilds and users in the last hour.", samples)
+
+        if metric.enabled:
+            samples: dict[str, float] = {}
+            for command, histograms in metric.histograms.items():
+                for phase, histogram in histograms.items():
+                    labels = f'command="{command}",phase="{phase}"'
+                    total = 0
+                    for bound, count in zip(histogram.BOUNDS, histogram.counts):
+                        total += count
+                        samples[f'_bucket{{{labels},le="{bound}"}}'] = total
+                    samples[f'_bucket{{{labels},le="+Inf"}}'] = histogram.count
+                    samples[f"_sum{{{labels}}}"] = histogram.sum
+                    samples[f"_count{{{labels}}}"] = histogram.count
+            add("phase_seconds", "histogram", "Seconds spent in each phase of commands.",
+                samples)
+
+        return lines
@@ -0,0 +1,181 @@
+"""
+A program that provides bot managed by bot_cps
+
+The GNU General Public License v3.0 (GPL-3.0)
+
+Copyright (C) 2021-present ster <ster.physics@gmail.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program. If not, see <https://www.gnu.org/licenses/>.
+
+"""
+
+__all__ = (
+    "CountMinSketch",
+    "HeavyHitters",
+    "heavy",
+)
+
+
+from collections import deque
+from random import Random
+from time import monotonic
+from typing import Hashable
+
+from .accounting import ledger
+
+
+# Mersenne prime for the hash family of ``CountMinSketch``
+_PRIME = 2**61 - 1
+
+
+class CountMinSketch(object):
+    """Approximate weights of keys in ``depth`` rows of ``width`` counters.
+
+    Estimates never fall below the true weight, and exceed it by at most
+    about ``e / width`` of the total weight with high probability.
+
+    """
+
+    __slots__ = ("width", "depth", "rows", "hashes")
+
+    def __init__(self, width: int = 1024, depth: int = 4, seed: int = 0) -> None:
+        self.width: int = width
+        self.depth: int = depth
+        self.rows: list[list[float]] = [[0.] * width for idx in range(depth)]
+
+        random = Random(seed)
+        self.hashes: list[tuple[int, int]] = [
+            (random.randrange(1, _PRIME), random.randrange(_PRIME)) for idx in range(depth)
+        ]
+
+    def _indices(self, key: Hashable) -> list[int]:
+        h = hash(key)
+        return [(a * h + b) % _PRIME % self.width for a, b in self.hashes]
+
+    def add(self, key: Hashable, weight: float = 1.) -> None:
+        for row, idx in zip(self.rows, self._indices(key)):
+            row[idx] += weight
+
+    def estimate(self, key: Hashable) -> float:
+        return min(row[idx] for row, idx in zip(self.rows, self._indices(key)))
+
+    def clear(self) -> None:
+        for row in self.rows:
+            row[:] = [0.] * self.width
+
+
+class HeavyHitters(object):
+    """Top ``k`` keys by weight over a sliding window.
+
+    The window is divided into ``windows`` slots of ``span`` seconds, each
+    with its own ``CountMinSketch``; the oldest slot is dropped as time
+    goes by. Memory is bounded by the sketches and ``k`` candidates.
+
+    """
+
+    def __init__(self, k: int = 10, windows: int = 6, span: float = 600.,
+                 width: int = 1024, depth: int = 4) -> None:
+        self.k: int = k
+        self.span: float = span
+        self.sketches: deque[CountMinSketch] = deque(CountMinSketch(width, depth)
+                                                     for idx in range(windows))
+        self.totals: deque[float] = deque([0.] * windows)
+        self.started: float = monotonic()
+        self.candidates: dict[Hashable, float] = {}
+
+    @property
+    def total(self) -> float:
+        """Total weight in the window."""
+        self._rotate()
+        return sum(self.totals)
+
+    def _rotate(self) -> None:
+        """Drops slots older than the window."""
+        elapsed = int((monotonic() - self.started) // self.span)
+        if elapsed == 0:
+            return
+
+        for idx in range(min(elapsed, len(self.sketches))):
+            sketch = self.sketches.popleft()
+            sketch.clear()
+            self.sketches.append(sketch)
+            self.totals.popleft()
+            self.totals.append(0.)
+        self.started += elapsed * self.span
+
+        self.candidates = {key: self._estimate(key) for key in self.candidates}
+        self.candidates = {key: value for key, value in self.candidates.items() if value > 0}
+
+    def _estimate(self, key: Hashable) -> float:
+        # all sketches share the hash family, so rows are summed before the minimum
+        indices = self.sketches[0]._indices(key)
+        return min(sum(sketch.rows[row][idx] for sketch in self.sketches)
+                   for row, idx in enumerate(indices))
+
+    def add(self, key: Hashable, weight: float = 1.) -> None:
+        self._rotate()
+        self.sketches[-1].add(key, weight)
+        self.totals[-1] += weight
+
+        self.candidates[key] = self._estimate(key)
+        if len(self.candidates) > self.k:
+            del self.candidates[min(self.candidates, key=self.candidates.__getitem__)]
+
+    def estimate(self, key: Hashable) -> float:
+        """Estimates the weight of ``key`` in the window."""
+        self._rotate()
+        return self._estimate(key)
+
+    def share(self, key: Hashable) -> float:
+        """Estimates the fraction of the total weight used by ``key``."""
+        total = self.total
+        return self._estimate(key) / total if total > 0 else 0.
+
+    def top(self, n: int | None = None) -> list[tuple[Hashable, float]]:
+        """Obtains the heaviest keys and their weights."""
+        self._rotate()
+        return sorted(self.candidates.items(), key=lambda item: -item[1])[:n]
+
+
+class Heavy(object):
+    """Guilds and users which use the most render cost.
+
+    Each render command adds its estimated cost, which is the mean CPU
+    seconds of the command in render workers so far (see ``ledger``).
+
+    """
+
+    # cost of a command not measured yet
+    DEFAULT_COST = .1
+
+    def __init__(self) -> None:
+        self.guilds = HeavyHitters()
+        self.users = HeavyHitters()
+
+    def cost(self, name: str) -> float:
+        """Estimates the render cost of an invocation of ``name``."""
+        usage = ledger.commands.get(name)
+        if usage is None or usage.cpu == 0.:
+            return self.DEFAULT_COST
+        return usage.cpu / usage.count
+
+    def record(self, name: str, guild_id: int | None, user_id: int) -> None:
+        cost = self.cost(name)
+        self.guilds.add(guild_id, cost)
+        self.users.add(user_id, cost)
+
+
+heavy = Heavy()
+
+del Heavy
@@ -21,17 +21,15 @@ along with this program. If not, see <https://www.gnu.org/licenses/>.
 """
 
 import logging
-from glob import glob
-from os.path import basename
 
-from discord import Embed, app_commands
+from discord import Embed, Locale, app_commands
 from discord.app_commands import Choice
 from discord.ext import commands
 from discord.ext.commands import Bot, Context
 
+from .asset import asset
 from .base import Cog
 from .config import config
-from .path import path
 from .translator import locale_str as _
 
 
@@ -47,7 +45,50 @@ async def teardown(bot: Bot) -> None:
     await bot.remove_cog("Help")
 
 
-cmd_list = sorted(list(map(lambda file: basename(file), glob(path.title_dir + "/*"))))
+cmd_list = [*asset.docs[Locale.japanese.value]["title"]]
+
+
+class HelpIndex(object):
+    """Help embeds for every locale, built once at startup.
+
+    Docs missing in a locale fall back to Japanese.
+
+    """
+
+    def __init__(self) -> None:
+        self.lists: dict[Locale, Embed] = {}
+        self.details: dict[Locale, dict[str, Embed]] = {}
+
+        fallback = asset.docs[Locale.japanese.value]
+
+        for locale, docs in asset.docs.items():
+            for kind in "title", "detail":
+                missing = [cmd for cmd in cmd_list if cmd not in docs[kind]]
+                if missing != []:
+                    logger.warning(f"Missing {kind} docs in {locale}: {', '.join(missing)}")
+
+        for locale in Locale:
+            docs = asset.docs.get(locale.value, fallback)
+            titles = {cmd: docs["title"].get(cmd, fallback["title"][cmd]) for cmd in cmd_list}
+            details = {cmd: docs["detail"].get(cmd, fallback["detail"][cmd]) for cmd in cmd_list}
+
+            title = _("コマンド一覧").to(locale)
+            description = "".join(f"`/{cmd}`：{titles[cmd]}" for cmd in cmd_list)
+            self.lists[locale] = Embed(title=title, description=description, color=config.color)
+
+            self.details[locale] = {
+                cmd: Embed(title=f"/{cmd}", description=details[cmd], color=config.color)
+                for cmd in cmd_list
+            }
+
+    def get(self, command: str, locale: Locale) -> Embed:
+        """Obtains the embed of ``command``, or of commands list if empty."""
+        if command == "":
+            return self.lists[locale]
+        return self.details[locale][command]
+
+
+help_index = HelpIndex()
 
 
 class Help(Cog):
@@ -63,21 +104,4 @@ class Help(Cog):
     )
     @app_commands.choices(command = [Choice(name=cmd, value=cmd) for cmd in cmd_list])
     async def help(self, ctx: Context, command: str = "") -> None:
-        await ctx.defer()
-
-        if command == "": # shows commands list
-            title = _("コマンド一覧").to(ctx.interaction.locale)
-            description = ""
-            for cmd in cmd_list:
-                with open(path.docs_title(cmd, ctx.interaction.locale), "r") as f:
-                    description += f"`/{cmd}`：{f.read()}"
-
-            embed = Embed(title=title, description=description, color=config.color)
-
-        else: # shows command detail
-            with open(path.docs_detail(command, ctx.interaction.locale), "r") as f:
-                description = f.read()
-
-            embed = Embed(title=f"/{command}", description=description, color=config.color)
-
-        await ctx.send(embed=embed)
+        await ctx.send(embed=help_index.get(command, ctx.interaction.locale))
@@ -0,0 +1,172 @@
+"""
+A program that provides bot managed by bot_cps
+
+The GNU General Public License v3.0 (GPL-3.0)
+
+Copyright (C) 2021-present ster <ster.physics@gmail.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program. If not, see <https://www.gnu.org/licenses/>.
+
+"""
+
+__all__ = (
+    "Offender",
+    "lag",
+)
+
+
+import logging
+import sys
+import threading
+from asyncio import AbstractEventLoop, Task, create_task, current_task, get_running_loop, sleep
+from dataclasses import dataclass
+from time import perf_counter
+from traceback import format_stack
+
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Offender:
+    """Stalls of the event loop caused while a command or view was running."""
+    name: str
+    count: int = 0
+    total: float = 0.
+    worst: float = 0.
+    stack: str = ""
+
+    def add(self, stall: float, stack: str) -> None:
+        self.count += 1
+        self.total += stall
+        if stall > self.worst:
+            self.worst = stall
+            self.stack = stack
+
+
+class LagMonitor(object):
+    """Detects event loop stalls and attributes them to commands and views.
+
+    A heartbeat task on the loop ticks every ``interval`` seconds and a
+    watchdog thread watches it. When the heartbeat is late by more than
+    ``threshold``, the watchdog samples the stack of the loop thread and
+    the command or view running in the current task; the stall is recorded
+    once the heartbeat resumes.
+
+    ```python
+    lag.start()
+    lag.enter("deck")  # in the task running the command
+    lag.exit()
+    lag.worst(5)
+    ```
+
+    """
+
+    # frames kept in a stack sample
+    STACK_LIMIT = 12
+
+    def __init__(self) -> None:
+        self.threshold: float = .2
+        self.interval: float = .05
+
+        self.loop: AbstractEventLoop | None = None
+        self.thread_id: int | None = None
+        self.heartbeat: Task | None = None
+        self.watchdog: threading.Thread | None = None
+        self.stopped = threading.Event()
+
+        self.beat: float = 0.
+        self.lag: float = 0.
+        self.active: dict[Task, str] = {}
+        self.offenders: dict[str, Offender] = {}
+
+        # offender and stack sampled during the current stall
+        self.sample: tuple[str, str] | None = None
+
+    @property
+    def running(self) -> bool:
+        return self.heartbeat is not None and not self.heartbeat.done()
+
+    def start(self, threshold: float | None = None) -> None:
+        """Starts monitoring the running loop."""
+        if self.running:
+            return
+        if threshold is not None:
+            self.threshold = threshold
+
+        self.loop = get_running_loop()
+        self.thread_id = threading.get_ident()
+        self.beat = perf_counter()
+        self.stopped.clear()
+
+        self.heartbeat = create_task(self._heartbeat())
+        self.watchdog = threading.Thread(target=self._watch, name="bot_cps-lag", daemon=True)
+        self.watchdog.start()
+        return
+
+    def stop(self) -> None:
+        self.stopped.set()
+        if self.heartbeat is not None:
+            self.heartbeat.cancel()
+        return
+
+    def enter(self, name: str) -> None:
+        """Marks the current task as running ``name``."""
+        task = current_task()
+        if task is not None:
+            self.active[task] = name
+
+    def exit(self) -> None:
+        """Unmarks the current task."""
+        task = current_task()
+        if task is not None:
+            self.active.pop(task, None)
+
+    async def _heartbeat(self) -> None:
+        while True:
+            await sleep(self.interval)
+            now = perf_counter()
+            self.lag = now - self.beat - self.interval
+            self.beat = now
+
+            # a sample is only valid for the stall it was taken in
+            sample, self.sample = self.sample, None
+            if self.lag > self.threshold:
+                name, stack = sample or ("unknown", "")
+                if name not in self.offenders:
+                    self.offenders[name] = Offender(name)
+                self.offenders[name].add(self.lag, stack)
+                logger.warning(f"Event loop stalled for {self.lag*1000:.0f}ms in {name}.")
+
+    def _watch(self) -> None:
+        while not self.stopped.wait(self.interval):
+            if self.sample is not None or perf_counter() - self.beat < self.threshold:
+                continue
+
+            frame = sys._current_frames().get(self.thread_id)
+            stack = "".join(format_stack(frame, self.STACK_LIMIT)) if frame else ""
+            try:
+                task = current_task(self.loop)
+            except RuntimeError:
+                task = None
+            self.sample = (self.active.get(task, "unknown"), stack)
+
+    def worst(self, n: int = 5) -> list[Offender]:
+        """Obtains ``n`` offenders with the longest stalls."""
+        return sorted(self.offenders.values(), key=lambda offender: -offender.worst)[:n]
+
+
+lag = LagMonitor()
+
+del LagMonitor
@@ -20,9 +20,15 @@ along with this program. If not, see <https://www.gnu.org/licenses/>.
 
 """
 
+import json
 import logging
+import os
+from asyncio import Task, create_task, sleep
+from glob import glob
+from time import time
 
 import discord
+from discord import Guild
 from discord.ext import commands, tasks
 from discord.ext.commands import Bot
 
@@ -45,23 +51,118 @@ class Listener(Cog):
         super().__init__(bot, logger)
         self.server: int = 0
 
+        # seconds to gather guild events into one presence update
+        self.debounce: float = 10.
+        self.pending: Task | None = None
+        # guild events not yet reflected in presence
+        self.dirty: bool = False
+
+        # seconds after which counts reported by other processes are ignored
+        self.stale: float = 1800.
+        self.cluster_dir: str = getattr(self.bot, "cluster_dir", "")
+
+    async def cog_unload(self) -> None:
+        await super().cog_unload()
+        self.refresh.cancel()
+        if self.pending is not None:
+            self.pending.cancel()
+        if self.cluster_dir != "":
+            # the count of a process which has gone should not be added up
+            try:
+                os.remove(self.cluster_file)
+            except OSError:
+                pass
+        return
+
     @commands.Cog.listener("on_ready")
     async def on_ready(self) -> None:
-        if not self.presence.is_running():
-            await self.presence.start()
+        # presence is lost when the session is re-identified
+        self.server = 0
+        self.schedule()
+        if self.cluster_dir != "" and not self.refresh.is_running():
+            self.refresh.start()
         return
 
-    @tasks.loop(seconds=1)
-    async def presence(self) -> None:
+    @commands.Cog.listener("on_guild_join")
+    async def on_guild_join(self, guild: Guild) -> None:
+        self.schedule()
+        return
+
+    @commands.Cog.listener("on_guild_remove")
+    async def on_guild_remove(self, guild: Guild) -> None:
+        self.schedule()
+        return
+
+    def schedule(self) -> None:
+        """Updates presence after ``debounce`` seconds unless already scheduled."""
+        self.dirty = True
+        if self.pending is None or self.pending.done():
+            self.pending = create_task(self._update_later())
+            self.pending.add_done_callback(self._error_handler)
+        return
+
+    async def _update_later(self) -> None:
+        # events arriving while presence is updated are picked up by another round
+        while self.dirty:
+            await sleep(self.debounce)
+            self.dirty = False
+            await self.presence()
+
+    @tasks.loop(minutes=10)
+    async def refresh(self) -> None:
+        """Picks up guild counts changed by the other processes."""
+        self.schedule()
+        return
+
+    @property
+    def cluster_file(self) -> str:
+        """File in ``cluster_dir`` to which this process writes its count."""
+        name = getattr(self.bot, "cluster_id", "")
+        if name == "":
+            shard_ids = getattr(self.bot, "shard_ids", None)
+            if shard_ids:
+                name = f"shard-{min(shard_ids)}-{max(shard_ids)}"
+            elif self.bot.shard_id is not None:
+                name = f"shard-{self.bot.shard_id}"
+            else:
+                name = f"pid-{os.getpid()}"
+        return f"{self.cluster_dir}/{name}.json"
+
+    def guild_count(self) -> int:
+        """Obtains the number of guilds over all processes.
+
+        When ``cluster_dir`` of the bot is set, each process writes its own
+        count there and sums up the counts written by the others.
+
+        """
         server = len(self.bot.guilds)
+        if self.cluster_dir == "":
+            return server
+
+        own = self.cluster_file
+        # the others never see a partially written file
+        with open(f"{own}.{os.getpid()}.tmp", "w") as f:
+            json.dump({"pid": os.getpid(), "guilds": server}, f)
+        os.replace(f"{own}.{os.getpid()}.tmp", own)
+
+        total = server
+        for file in glob(f"{self.cluster_dir}/*.json"):
+            if file == own:
+                continue
+            try:
+                if time() - os.path.getmtime(file) > self.stale:
+                    continue
+                with open(file, "r") as f:
+                    total += json.load(f)["guilds"]
+            except (OSError, ValueError, KeyError) as e:
+                self.logger.warning(f"Skipped {file}: {e!r}")
+        return total
+
+    async def presence(self) -> None:
+        server = self.guild_count()
         if self.server != server:
             self.server = server
             activity = discord.Activity(name=f"{server:,} servers", type=discord.ActivityType.playing)
             await self.bot.change_presence(activity=activity)
             self.logger.info(f"Activity changed to {server:,} servers.")
         return
-
-    @presence.before_loop
-    async def before_presence(self) -> None:
-        await self.bot.wait_until_ready()
-        return
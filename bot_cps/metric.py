@@ -0,0 +1,175 @@
+"""
+A program that provides bot managed by bot_cps
+
+The GNU General Public License v3.0 (GPL-3.0)
+
+Copyright (C) 2021-present ster <ster.physics@gmail.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program. If not, see <https://www.gnu.org/licenses/>.
+
+"""
+
+__all__ = (
+    "Histogram",
+    "metric",
+)
+
+
+from bisect import bisect_left
+from collections import Counter
+from contextvars import ContextVar
+from time import perf_counter
+from typing import Literal
+
+
+Phase = Literal["defer", "render", "encode", "upload", "total"]
+
+PHASES: tuple[Phase, ...] = ("defer", "render", "encode", "upload", "total")
+
+
+class Histogram(object):
+    """Latency histogram with fixed buckets in seconds."""
+
+    __slots__ = ("counts", "count", "sum", "max")
+
+    # upper bounds of buckets, the last bucket is unbounded
+    BOUNDS: tuple[float, ...] = (
+        .001, .002, .005, .01, .02, .05, .1, .2, .5, 1., 2., 5., 10., 30.,
+    )
+
+    def __init__(self) -> None:
+        self.counts: list[int] = [0] * (len(self.BOUNDS) + 1)
+        self.count: int = 0
+        self.sum: float = 0.
+        self.max: float = 0.
+
+    def observe(self, seconds: float) -> None:
+        self.counts[bisect_left(self.BOUNDS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+
+    def percentile(self, q: float) -> float:
+        """Obtains the upper bound of the bucket in which the ``q`` quantile falls."""
+        rank = q * self.count
+        total = 0
+        for bound, count in zip(self.BOUNDS, self.counts):
+            total += count
+            if total >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def snapshot(self) -> dict[str, float]:
+        return {
+            "count": self.count,
+            "mean": self.sum / self.count if self.count else 0.,
+            "p50": self.percentile(.5),
+            "p95": self.percentile(.95),
+            "p99": self.percentile(.99),
+            "max": self.max,
+        }
+
+
+class Timer(object):
+    """Observes the seconds spent in a ``with`` block."""
+
+    __slots__ = ("phase", "start")
+
+    def __init__(self, phase: Phase) -> None:
+        self.phase: Phase = phase
+        self.start: float = 0.
+
+    def __enter__(self) -> "Timer":
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        metric.observe(self.phase, perf_counter() - self.start)
+
+
+class _NullTimer(object):
+    """Does nothing, used while metrics are disabled."""
+
+    __slots__ = ()
+
+    def __enter__(self) -> "_NullTimer":
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        pass
+
+
+_null_timer = _NullTimer()
+
+
+class Metric(object):
+    """Per-command latency histograms of each phase of commands.
+
+    Phases are attributed to the command which is running in the current
+    task, so shared helpers such as ``render`` need not know the command.
+    Everything is a no-op until ``enabled`` is set.
+
+    ```python
+    metric.begin("deck")
+    with metric.timer("upload"):
+        await interaction.followup.send(file=file)
+    metric.snapshot()["deck"]["upload"]["p95"]
+    ```
+
+    """
+
+    def __init__(self) -> None:
+        self.enabled: bool = False
+        # invocations of each command, counted even while disabled
+        self.invocations: Counter[str] = Counter()
+        self.histograms: dict[str, dict[Phase, Histogram]] = {}
+        self.command: ContextVar[str | None] = ContextVar("command", default=None)
+
+    def begin(self, command: str) -> None:
+        """Attributes the following phases in the current task to ``command``."""
+        self.invocations[command] += 1
+        if self.enabled:
+            self.command.set(command)
+
+    def observe(self, phase: Phase, seconds: float, command: str | None = None) -> None:
+        """Records ``seconds`` spent in ``phase`` of ``command`` (the current one by default)."""
+        if not self.enabled:
+            return
+        command = command or self.command.get()
+        if command is None:
+            return
+        if command not in self.histograms:
+            self.histograms[command] = {phase: Histogram() for phase in PHASES}
+        self.histograms[command][phase].observe(seconds)
+
+    def timer(self, phase: Phase) -> Timer | _NullTimer:
+        """Obtains a context manager which observes ``phase``."""
+        if not self.enabled:
+            return _null_timer
+        return Timer(phase)
+
+    def snapshot(self) -> dict[str, dict[Phase, dict[str, float]]]:
+        """Obtains statistics of every phase of every command."""
+        return {
+            command: {phase: histogram.snapshot() for phase, histogram in histograms.items()}
+            for command, histograms in self.histograms.items()
+        }
+
+    def reset(self) -> None:
+        self.histograms.clear()
+
+
+metric = Metric()
+
+del Metric
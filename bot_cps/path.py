@@ -28,8 +28,6 @@ __all__ = (
 import os
 from os.path import abspath, dirname, exists
 
-from discord import Locale
-
 
 _ROOTPATH = dirname(abspath(__file__))
 
@@ -74,29 +72,10 @@ class Path(object):
         """Image of the white team portal."""
         return f"{_ASSET_TEAM}/white.png"
 
-    def docs_detail(self, cmd: str, locale: Locale) -> str:
-        """Obtains path to command detail docs."""
-        if exists(f"{_DOCS_DIR}/{locale.value}/detail/{cmd}"):
-            return f"{_DOCS_DIR}/{locale.value}/detail/{cmd}"
-        else:
-            return f"{_DOCS_DIR}/{Locale.japanese.value}/detail/{cmd}"
-
-    def docs_title(self, cmd: str, locale: Locale) -> str:
-        """Obtains path to command title docs."""
-        if exists(f"{_DOCS_DIR}/{locale.value}/title/{cmd}"):
-            return f"{_DOCS_DIR}/{locale.value}/title/{cmd}"
-        else:
-            return f"{_DOCS_DIR}/{Locale.japanese.value}/title/{cmd}"
-
-    @property
-    def detail_dir(self) -> str:
-        """Directory path to command details."""
-        return f"{_DOCS_DIR}/detail"
-
     @property
-    def title_dir(self) -> str:
-        """Directory path to command title."""
-        return f"{_DOCS_DIR}/title"
+    def docs_dir(self) -> str:
+        """Directory path to command docs."""
+        return _DOCS_DIR
 
     @property
     def agreed_json(self) -> str:
@@ -107,6 +86,17 @@ class Path(object):
                 f.write("[]")
         return path
 
+    def setting(self, name: str) -> str:
+        """Path to a file that stores per-user settings of ``name``."""
+        return f"{os.getcwd()}/setting_{name}.sqlite3"
+
+    @property
+    def profile_dir(self) -> str:
+        """Directory in which command profiles are written."""
+        path = f"{os.getcwd()}/profile"
+        os.makedirs(path, exist_ok=True)
+        return path
+
     @property
     def terms_of_service(self) -> str:
         """Path of Terms of Service file."""
@@ -21,11 +21,20 @@ along with this program. If not, see <https://www.gnu.org/licenses/>.
 """
 
 import logging
+from asyncio import get_running_loop, sleep
+from time import perf_counter
 
+from discord import Embed
 from discord.ext import commands
 from discord.ext.commands import Bot, Context
 
+from .audit import get_writer
 from .base import Cog
+from .config import config
+from .lag import lag
+from .render import render
+from .sink import get_sink
+from .translator import _get_translator
 from .translator import locale_str as _
 
 
@@ -48,7 +57,35 @@ class Ping(Cog):
         description=_("ping値を返す"),
     )
     async def ping(self, ctx: Context) -> None:
-        await ctx.defer()
-        latency = round(ctx.bot.latency * 1000)
-        await ctx.send(f"Pong!! (`{latency}ms`)")
+        embed = Embed(title="Pong!!", color=config.color)
+
+        embed.add_field(name="Gateway", value=f"`{ctx.bot.latency*1000:.0f}ms`")
+        embed.add_field(name="REST", value=f"`{await self.rest_latency()*1000:.0f}ms`")
+        embed.add_field(name="Loop", value=f"`{await self.loop_lag()*1000:.1f}ms`")
+
+        embed.add_field(name="Render", value=f"`{render.depth}/{render.max_workers}`")
+        sink, writer = get_sink(ctx.bot), get_writer(ctx.bot)
+        embed.add_field(name="Log", value=f"`{sink.depth if sink else '-'}`")
+        embed.add_field(name="Audit", value=f"`{writer.depth if writer else '-'}`")
+
+        info = _get_translator.cache_info()
+        embed.add_field(name="Translator",
+                        value=f"`{info.hits} hits / {info.misses} misses`")
+
+        await ctx.send(embed=embed)
         return
+
+    async def rest_latency(self) -> float:
+        """Measures the round trip of a REST request."""
+        start = perf_counter()
+        await self.bot.application_info()
+        return perf_counter() - start
+
+    async def loop_lag(self) -> float:
+        """Obtains the lag of the event loop, from the lag monitor if running."""
+        if lag.running:
+            return max(lag.lag, 0.)
+        loop = get_running_loop()
+        start = loop.time()
+        await sleep(0)
+        return loop.time() - start
@@ -0,0 +1,122 @@
+"""
+A program that provides bot managed by bot_cps
+
+The GNU General Public License v3.0 (GPL-3.0)
+
+Copyright (C) 2021-present ster <ster.physics@gmail.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program. If not, see <https://www.gnu.org/licenses/>.
+
+"""
+
+__all__ = (
+    "profiler",
+)
+
+
+import logging
+from asyncio import Task, current_task
+from cProfile import Profile
+from pstats import Stats
+from time import time
+
+from .path import path
+
+
+logger = logging.getLogger(__name__)
+
+
+class Profiler(object):
+    """Profiles the next invocations of armed commands and views with ``cProfile``.
+
+    Only one invocation is profiled at a time; invocations starting while
+    another one is profiled are not counted. ``cProfile`` sees the whole
+    event loop thread, so other tasks running meanwhile are included.
+
+    ```python
+    profiler.arm("deck", 10)
+    profiler.begin("deck")  # in the task running the command
+    profiler.end()          # writes the profile after the 10th invocation
+    ```
+
+    """
+
+    def __init__(self) -> None:
+        # invocations left to profile of each name
+        self.targets: dict[str, int] = {}
+        self.stats: dict[str, Stats] = {}
+        self.current: tuple[Task, str, Profile] | None = None
+
+    def arm(self, name: str, count: int) -> None:
+        """Profiles the next ``count`` invocations of ``name``."""
+        self.targets[name] = count
+        self.stats.pop(name, None)
+        return
+
+    def begin(self, name: str) -> None:
+        """Starts profiling the current task if ``name`` is armed."""
+        if name not in self.targets or self.current is not None:
+            return
+
+        profile = Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # another profiler is active
+            return
+        self.current = (current_task(), name, profile)
+        return
+
+    def end(self) -> None:
+        """Stops profiling the current task and aggregates its profile."""
+        if self.current is None or self.current[0] is not current_task():
+            return
+
+        task, name, profile = self.current
+        profile.disable()
+        self.current = None
+
+        if name in self.stats:
+            self.stats[name].add(profile)
+        else:
+            self.stats[name] = Stats(profile)
+
+        self.targets[name] -= 1
+        if self.targets[name] <= 0:
+            del self.targets[name]
+            self.dump(name)
+        return
+
+    def dump(self, name: str) -> str:
+        """Writes the aggregated profile of ``name`` and returns its path."""
+        stats = self.stats.pop(name)
+        filename = f"{path.profile_dir}/{name.replace(':', '_')}-{int(time())}.prof"
+        stats.dump_stats(filename)
+        logger.info(f"Profile of {name} has been written to {filename}.")
+        return filename
+
+    def close(self) -> None:
+        """Writes all partial profiles."""
+        if self.current is not None:
+            self.current[2].disable()
+            self.current = None
+        for name in [*self.stats]:
+            self.dump(name)
+        self.targets.clear()
+        return
+
+
+profiler = Profiler()
+
+del Profiler
@@ -0,0 +1,155 @@
+"""
+A program that provides bot managed by bot_cps
+
+The GNU General Public License v3.0 (GPL-3.0)
+
+Copyright (C) 2021-present ster <ster.physics@gmail.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program. If not, see <https://www.gnu.org/licenses/>.
+
+"""
+
+__all__ = (
+    "render",
+)
+
+
+import os
+from asyncio import Future, ensure_future, get_running_loop, shield
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+from functools import partial
+from io import BytesIO
+from time import thread_time
+from typing import Any, Callable, Hashable, TypeVar
+
+from discord import File
+from PIL import Image as PIL
+from PIL.Image import Image
+
+from .accounting import ledger
+from .metric import metric
+from .tracing import tracer
+
+
+T = TypeVar("T")
+
+
+class Render(object):
+    """Runs image rendering on a worker pool shared by all cogs."""
+
+    def __init__(self) -> None:
+        self.max_workers: int = min(4, os.cpu_count() or 1)
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                           thread_name_prefix="bot_cps-render")
+        self.pending: int = 0
+
+        # jobs in flight by key, shared by concurrent identical requests
+        self.flights: dict[Hashable, Future] = {}
+        self.coalesced: int = 0
+
+    @property
+    def depth(self) -> int:
+        """Number of jobs submitted to the pool and not finished yet."""
+        return self.pending
+
+    async def run(self, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """Runs ``func`` on the worker pool without blocking the event loop."""
+        with metric.timer("render"), tracer.span("render", func=getattr(func, "__name__", "")):
+            return await self._submit(func, *args, **kwargs)
+
+    async def shared(self, key: Hashable, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """Runs ``func`` like ``run``, sharing one job among concurrent calls with the same ``key``.
+
+        ``key`` must identify the inputs of the rendering, and the result is
+        shared among the callers, so they must not modify it.
+
+        """
+        with metric.timer("render"), tracer.span("render", func=getattr(func, "__name__", "")):
+            return await self._shared(key, func, *args, **kwargs)
+
+    async def _shared(self, key: Hashable, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        if key in self.flights:
+            self.coalesced += 1
+            return await shield(self.flights[key])
+
+        future = ensure_future(self._submit(func, *args, **kwargs))
+        self.flights[key] = future
+        future.add_done_callback(lambda future: self.flights.pop(key, None))
+        # a cancelled caller must not cancel the job of the others
+        return await shield(future)
+
+    async def _submit(self, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        loop = get_running_loop()
+        self.pending += 1
+        try:
+            # workers run in a copy of the context to keep the current span and usage
+            context = copy_context()
+            call = partial(context.run, self._call, func, *args, **kwargs)
+            return await loop.run_in_executor(self.executor, call)
+        finally:
+            self.pending -= 1
+
+    @staticmethod
+    def _call(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """Calls ``func``, charging its CPU time to the running invocation."""
+        start = thread_time()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            ledger.charge(cpu=thread_time() - start)
+
+    @staticmethod
+    def encode(img: Image) -> BytesIO:
+        """Encodes ``img`` to PNG bytes."""
+        image_bytes = BytesIO()
+        img.save(image_bytes, "PNG", quality=100, optimize=True)
+        image_bytes.seek(0)
+        return image_bytes
+
+    async def file(self, img: Image, filename: str, key: Hashable | None = None) -> File:
+        """Encodes ``img`` on the worker pool and wraps it as ``discord.File``.
+
+        If ``key`` is given, concurrent encodings of the same image are shared.
+
+        """
+        with metric.timer("encode"), tracer.span("encode"):
+            if key is None:
+                fp = await self._submit(self.encode, img)
+            else:
+                fp = BytesIO(await self._shared(("encode", key), self._encode_bytes, img))
+        ledger.charge(encoded=fp.getbuffer().nbytes)
+        return File(fp=fp, filename=filename)
+
+    @classmethod
+    def _encode_bytes(cls, img: Image) -> bytes:
+        return cls.encode(img).getvalue()
+
+    @staticmethod
+    def composite(images: list[Image], margin: int = 0) -> Image:
+        """Lays out ``images`` vertically in one image."""
+        width = max(img.width for img in images)
+        height = sum(img.height for img in images) + margin * (len(images) - 1)
+
+        canvas = PIL.new("RGBA", (width, height), (0, 0, 0, 0))
+        top = 0
+        for img in images:
+            canvas.paste(img, (0, top))
+            top += img.height + margin
+        return canvas
+
+
+render = Render()
+
+del Render
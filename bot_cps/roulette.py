@@ -20,22 +20,22 @@ along with this program. If not, see <https://www.gnu.org/licenses/>.
 
 """
 
-import json
 import logging
-from collections import UserDict
-from io import BytesIO
 from random import choice
 from typing import Literal
 
-from compass import HeroData, Role, get_translator
-from discord import (ButtonStyle, Embed, File, Interaction, Locale,
-                     PartialEmoji, ui)
+from compass import Hero, HeroData, Role, get_translator
+from discord import ButtonStyle, Embed, Interaction, Locale, PartialEmoji, ui
 from discord.ext import commands
 from discord.ext.commands import Bot, Context
 from discord.interactions import Interaction
 
+from .asset import asset
 from .base import Cog, View
-from .path import path
+from .metric import metric
+from .render import render
+from .setting import SettingStore
+from .tracing import tracer
 from .translator import locale_str as _
 
 
@@ -56,80 +56,98 @@ data = HeroData()
 class Roulette(Cog):
     def __init__(self, bot: Bot) -> None:
         super().__init__(bot, logger)
-        self.user_argument: dict[int, Argument] = {}
+        self.settings = SettingStore("roulette", Argument().mask)
+
+    async def cog_unload(self) -> None:
+        await super().cog_unload()
+        await self.settings.close()
+        return
 
 
     @commands.hybrid_command(
         description = _("ヒーロールーレット"),
+        extras = {"render": True},
     )
     async def roulette(self, ctx: Context) -> None:
-        argument = self.user_argument.get(ctx.author.id, Argument())
+        argument = Argument(await self.settings.get(ctx.author.id))
         await argument.send_hero(ctx.interaction)
-        self.user_argument[ctx.author.id] = argument
         return
 
     @commands.hybrid_command(
         name = "roulette-setting",
         description = _("ヒーロールーレットの設定"),
+        extras = {"ephemeral": True},
     )
     async def roulette_setting(self, ctx: Context) -> None:
-        await ctx.defer(ephemeral=True)
-        argument = self.user_argument.get(ctx.author.id, Argument())
-        view = RouletteView(ctx.interaction, argument)
+        argument = Argument(await self.settings.get(ctx.author.id))
+        view = RouletteView(ctx.interaction, argument, self.settings)
         await ctx.send(view=view, ephemeral=True)
-        self.user_argument[ctx.author.id] = argument
         return
 
 
-class Argument(UserDict):
-    def __init__(self) -> None:
-        super().__init__()
-        self.data: dict[Literal["original", "collabo"] | Role, bool]
-        self.data = {role: True for role in Role}
-        self.data.update({"original": True, "collabo": True,})
+Key = Literal["original", "collabo"] | Role
+
+# bit assigned to each key of ``Argument``
+_BITS: dict[Key, int] = {key: 1 << idx for idx, key in enumerate([*Role, "original", "collabo"])}
+
+_ROLE = sum(_BITS[role] for role in Role)
+_SOURCE = _BITS["original"] | _BITS["collabo"]
+
+_DEFAULT = _ROLE | _SOURCE
+
+
+def _build_pools() -> dict[int, tuple[Hero, ...]]:
+    """Builds hero pools for every legal ``Argument`` mask."""
+    pools: dict[int, tuple[Hero, ...]] = {}
+    for mask in range(_DEFAULT + 1):
+        argument = Argument(mask)
+        if not argument:
+            continue
+        pools[mask] = tuple(hero for hero in data
+                            if argument[hero.role]
+                            and argument["collabo" if hero.collabo else "original"])
+    return pools
+
+
+class Argument(object):
+    """Roulette setting encoded as a bitmask."""
+
+    __slots__ = ("mask",)
+
+    def __init__(self, mask: int = _DEFAULT) -> None:
+        self.mask: int = mask
+
+    def __getitem__(self, key: Key) -> bool:
+        return bool(self.mask & _BITS[key])
 
     def __bool__(self) -> bool:
         """Checks that this is legal parameter."""
-        flag = False
-        for role in Role:
-            flag |= self.data[role]
-        return (self.data["original"] or self.data["collabo"]) and flag
+        return bool(self.mask & _ROLE and self.mask & _SOURCE)
 
-    def update(self, key: Literal["original", "collabo"] | Role) -> None:
-        self.data[key] = not self.data[key]
+    def update(self, key: Key) -> None:
+        self.mask ^= _BITS[key]
         if not bool(self):
-            self.data[key] = not self.data[key]
+            self.mask ^= _BITS[key]
         return
 
     @property
-    def args(self) -> tuple[Role]:
-        """Obtains ``compass.HeroData.get_hero`` arguments."""
-        retval: list[Role] = []
-        for role in Role:
-            if self.data[role]:
-                retval.append(role)
-        return tuple(retval)
-
-    @property
-    def kwargs(self) -> dict[Literal["original", "collabo"], bool]:
-        """Obtains ``compass.HeroData.get_hero`` keyword arguments."""
-        return {
-            "original": self.data["original"],
-            "collabo": self.data["collabo"],
-        }
+    def pool(self) -> tuple[Hero, ...]:
+        """Heroes which can be chosen with this setting."""
+        return _pools[self.mask]
 
     async def send_hero(self, interaction: Interaction) -> None:
         """Generates hero ``discord.Embed`` from this and sends its."""
-        await interaction.response.defer()
-
-        hero = data.get_hero(*self.args, **self.kwargs)
-        img = getattr(hero, choice(["icon", "image"]))
+        if not interaction.response.is_done():
+            await interaction.response.defer()
 
-        image_bytes = BytesIO()
-        img.save(image_bytes, "PNG", quality=100, optimize=True)
-        image_bytes.seek(0)
+        if self.pool == ():
+            content = _("その条件ではヒーローを選べません").to(interaction.locale)
+            await interaction.followup.send(content=content)
+            return
 
-        file = File(fp=image_bytes, filename=f"{interaction.user.id}.png")
+        hero = choice(self.pool)
+        img = getattr(hero, choice(["icon", "image"]))
+        file = await render.file(img, f"{interaction.user.id}.png")
 
         translator = get_translator(interaction.locale.value)
 
@@ -137,10 +155,14 @@ class Argument(UserDict):
         embed.set_author(name=translator(hero.name),
                          icon_url=f"attachment://{file.filename}")
 
-        if not interaction.response.is_done():
-            await interaction.response.send_message(embed=embed, file=file)
-        else:
-            await interaction.followup.send(embed=embed, file=file)
+        with metric.timer("upload"), tracer.span("upload"):
+            if not interaction.response.is_done():
+                await interaction.response.send_message(embed=embed, file=file)
+            else:
+                await interaction.followup.send(embed=embed, file=file)
+
+
+_pools = _build_pools()
 
 
 class RoleButton(ui.Button):
@@ -153,8 +175,7 @@ class RoleButton(ui.Button):
         self.style = ButtonStyle.blurple
         self.row = 0
 
-        with open(path.emoji_json, "r") as f:
-            emojis = json.load(f)["role"]
+        emojis = asset.emoji["role"]
 
         key = f"role_{role.name.lower()}"
         self.emoji = PartialEmoji.from_str(emojis[key])
@@ -164,6 +185,7 @@ class RoleButton(ui.Button):
     async def callback(self, interaction: Interaction) -> None:
         await interaction.response.defer()
         self.view.argument.update(self.key)
+        self.view.save()
         self.view.update_style()
         await interaction.followup.edit_message(interaction.message.id, view=self.view)
 
@@ -184,6 +206,7 @@ class OriginalButton(ui.Button):
     async def callback(self, interaction: Interaction) -> None:
         await interaction.response.defer()
         self.view.argument.update(self.key)
+        self.view.save()
         self.view.update_style()
         await interaction.followup.edit_message(interaction.message.id, view=self.view)
 
@@ -204,6 +227,7 @@ class CollaboButton(ui.Button):
     async def callback(self, interaction: Interaction) -> None:
         await interaction.response.defer()
         self.view.argument.update(self.key)
+        self.view.save()
         self.view.update_style()
         await interaction.followup.edit_message(interaction.message.id, view=self.view)
 
@@ -222,18 +246,24 @@ class ResetButton(ui.Button):
     async def callback(self, interaction: Interaction) -> None:
         await interaction.response.defer()
         self.view.argument.__init__()
+        self.view.save()
         self.view.update_style()
         await interaction.followup.edit_message(interaction.message.id, view=self.view)
 
 
 class ExecuteButton(ui.Button):
     """Execute ``Button`` for roulette setting."""
+    # double clicks are dropped while running
+    exclusive = True
+    # goes through cooldown and admission like render commands
+    render = True
+
     def __init__(self, locale: Locale) -> None:
         super().__init__()
 
         self.view: RouletteView # just for typing
 
-        self.label = _("実行").to(locale)
+        self.text = _("実行（{0}）").to(locale)
         self.style = ButtonStyle.green
         self.row = 2
 
@@ -242,10 +272,12 @@ class ExecuteButton(ui.Button):
 
 
 class RouletteView(View):
-    def __init__(self, interaction: Interaction, argument: Argument):
+    def __init__(self, interaction: Interaction, argument: Argument, settings: SettingStore):
         super().__init__("roulette-setting", 600, logger)
         self.locale: Locale = interaction.locale
         self.argument: Argument = argument
+        self.settings: SettingStore = settings
+        self.user_id: int = interaction.user.id
 
         for role in Role:
             self.add_item(RoleButton(role))
@@ -257,6 +289,10 @@ class RouletteView(View):
 
         self.update_style()
 
+    def save(self) -> None:
+        """Stores the current setting of the user."""
+        self.settings[self.user_id] = self.argument.mask
+
     def update_style(self) -> None:
         """Updates all buttons style."""
 
@@ -266,3 +302,5 @@ class RouletteView(View):
                     child.style = ButtonStyle.blurple
                 else:
                     child.style = ButtonStyle.gray
+            elif isinstance(child, ExecuteButton):
+                child.label = child.text.format(len(self.argument.pool))
@@ -0,0 +1,348 @@
+"""
+A program that provides bot managed by bot_cps
+
+The GNU General Public License v3.0 (GPL-3.0)
+
+Copyright (C) 2021-present ster <ster.physics@gmail.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program. If not, see <https://www.gnu.org/licenses/>.
+
+"""
+
+__all__ = (
+    "SettingStore",
+)
+
+
+import logging
+import sqlite3
+from array import array
+from asyncio import TimerHandle, get_running_loop
+from concurrent.futures import Future, ThreadPoolExecutor
+from heapq import nsmallest
+from time import time
+from typing import Any, Callable, Iterator
+
+from .path import path
+
+
+logger = logging.getLogger(__name__)
+
+
+# markers of free slots in ``SettingStore.ids``; user ids are never 0
+_EMPTY = 0
+_DELETED = 2**64 - 1
+
+
+class SettingStore(object):
+    """Per-user settings encoded as integers, with bounded memory.
+
+    Recently used settings are kept in memory, up to ``capacity`` users.
+    The least recently used ones and those unused for ``ttl`` seconds are
+    moved to a SQLite file and loaded again when the user comes back.
+
+    The memory tier is an open addressing hash table made of two arrays of
+    unsigned 64-bit integers, so that a user takes 16 bytes per slot and no
+    Python object: ``ids`` holds user ids and ``values`` holds the setting
+    in the upper 32 bits and the last access (epoch seconds) in the lower.
+    Settings must therefore fit in 32 bits.
+
+    The SQLite file is only accessed from a thread of its own, so the event
+    loop never waits for the disk. Moved settings are written in batches of
+    ``batch`` users or after ``delay`` seconds, one transaction per batch.
+
+    ```python
+    store = SettingStore("deck", Argument().mask)
+    argument = Argument(await store.get(user_id))
+    store[user_id] = argument.mask
+    await store.close()
+    ```
+
+    """
+
+    # fraction of the users moved out at once when the memory tier is full
+    EVICTION = 1 / 8
+    # seconds between sweeps of settings unused for ``ttl`` seconds
+    SWEEP = 60
+
+    def __init__(self, name: str, default: int,
+                 capacity: int = 10_000, ttl: float = 3600,
+                 batch: int = 100, delay: float = 1., file: str | None = None) -> None:
+        """Constructor of this class.
+
+        Parameters
+        ----------
+        name: :class:`str`
+            Name of the store, used as the file name of the disk tier.
+        default: :class:`int`
+            Setting of users who have never changed it.
+        capacity: :class:`int`
+            Maximum number of users kept in memory.
+        ttl: :class:`float`
+            Seconds after which an unused setting is moved to the disk tier.
+        batch: :class:`int`
+            Number of moved settings written in one transaction.
+        delay: :class:`float`
+            Maximum seconds a moved setting waits to be written.
+        file: :class:`str` | None
+            Path of the disk tier. ``path.setting(name)`` if ``None``.
+
+        """
+        self.default: int = default
+        self.capacity: int = capacity
+        self.ttl: float = ttl
+        self.batch: int = batch
+        self.delay: float = delay
+        self.file: str = file or path.setting(name)
+
+        # a power of two, so that the table is at most 3/4 full
+        size = 8
+        while size * 3 < capacity * 4:
+            size *= 2
+        self.ids: array = array("Q", [0]) * size
+        self.values: array = array("Q", [0]) * size
+        self.shift: int = 64 - size.bit_length() + 1
+        self.used: int = 0
+        self.deleted: int = 0
+        self.swept: float = time()
+
+        self.spilled: int = 0
+        self.hits: int = 0
+        self.misses: int = 0
+
+        # user id -> setting moved out of memory and not written yet
+        self.pending: dict[int, int] = {}
+        self.timer: TimerHandle | None = None
+
+        # one thread runs all queries in order, and owns the connection
+        self.executor = ThreadPoolExecutor(max_workers=1,
+                                           thread_name_prefix=f"bot_cps-setting-{name}")
+        self.db: sqlite3.Connection | None = None
+
+    def __len__(self) -> int:
+        return self.used
+
+    def _slot(self, user_id: int) -> int:
+        """Obtains the slot of the user, or the free slot for the user if absent."""
+        mask = len(self.ids) - 1
+        slot = ((user_id * 0x9E3779B97F4A7C15) & 0xFFFFFFFFFFFFFFFF) >> self.shift
+        free = -1
+        while True:
+            key = self.ids[slot]
+            if key == user_id:
+                return slot
+            if key == _EMPTY:
+                return slot if free == -1 else free
+            if key == _DELETED and free == -1:
+                free = slot
+            slot = (slot + 1) & mask
+
+    def _live(self) -> Iterator[int]:
+        """Yields slots in use."""
+        for slot, key in enumerate(self.ids):
+            if key != _EMPTY and key != _DELETED:
+                yield slot
+
+    async def get(self, user_id: int) -> int:
+        """Obtains the setting of the user, loading it from the disk tier if needed."""
+        slot = self._slot(user_id)
+        if self.ids[slot] == user_id:
+            self.hits += 1
+            value = self.values[slot] >> 32
+        elif user_id in self.pending:
+            self.hits += 1
+            value = self.pending[user_id]
+        else:
+            self.misses += 1
+            # queued after the writes of all settings moved so far
+            row = await self._run(self._select, user_id)
+            slot = self._slot(user_id)
+            if self.ids[slot] == user_id:
+                # stored while loading
+                return self.values[slot] >> 32
+            value = self.default if row is None else row
+        self._touch(user_id, value)
+        return value
+
+    def __setitem__(self, user_id: int, value: int) -> None:
+        if not 0 <= value < 2**32:
+            raise ValueError(f"setting {value} does not fit in 32 bits")
+        self._touch(user_id, value)
+
+    def _touch(self, user_id: int, value: int) -> None:
+        """Stores the setting as recently used and evicts stale entries."""
+        now = int(time())
+        if now - self.swept >= self.SWEEP:
+            self.swept = now
+            self._evict([slot for slot in self._live()
+                         if now - (self.values[slot] & 0xFFFFFFFF) >= self.ttl])
+
+        slot = self._slot(user_id)
+        if self.ids[slot] != user_id:
+            if self.used >= self.capacity:
+                self._evict_oldest()
+                slot = self._slot(user_id)
+            if self.ids[slot] == _DELETED:
+                self.deleted -= 1
+            self.ids[slot] = user_id
+            self.values[slot] = value << 32 | now
+            self.used += 1
+            self._compact()
+            return
+        self.values[slot] = value << 32 | now
+
+    def _evict_oldest(self) -> None:
+        """Moves the least recently used users out, a fraction at once."""
+        count = max(int(self.capacity * self.EVICTION), 1)
+        self._evict(nsmallest(count, self._live(), key=lambda slot: self.values[slot] & 0xFFFFFFFF))
+
+    def _evict(self, slots: list[int]) -> None:
+        for slot in slots:
+            self._spill(self.ids[slot], self.values[slot])
+            self.ids[slot] = _DELETED
+        self.used -= len(slots)
+        self.deleted += len(slots)
+        self._compact()
+
+    def _compact(self) -> None:
+        """Rebuilds the table once deleted slots leave few empty ones.
+
+        Lookups end at an empty slot, so there must always be some.
+
+        """
+        if (self.used + self.deleted) * 8 <= len(self.ids) * 7:
+            return
+
+        entries = [(self.ids[slot], self.values[slot]) for slot in self._live()]
+        self.ids = array("Q", [0]) * len(self.ids)
+        self.deleted = 0
+        for user_id, packed in entries:
+            slot = self._slot(user_id)
+            self.ids[slot] = user_id
+            self.values[slot] = packed
+
+    def _spill(self, user_id: int, packed: int) -> None:
+        """Moves the entry to the disk tier."""
+        self.pending[user_id] = packed >> 32
+        self.spilled += 1
+
+        if len(self.pending) >= self.batch:
+            self._flush()
+        elif self.timer is None:
+            self.timer = get_running_loop().call_later(self.delay, self._flush)
+
+    def _flush(self) -> None:
+        """Writes the pending entries on the thread of the disk tier."""
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        if self.pending == {}:
+            return
+
+        pending, self.pending = self.pending, {}
+        future = self.executor.submit(self._write, pending)
+        future.add_done_callback(self._error_handler)
+
+    def _error_handler(self, future: Future) -> None:
+        exc = future.exception()
+        if exc:
+            logger.error(f"Failed to write settings to {self.file}.", exc_info=exc)
+
+    async def _run(self, func: Callable[..., Any], *args: Any) -> Any:
+        return await get_running_loop().run_in_executor(self.executor, func, *args)
+
+    def _connect(self) -> sqlite3.Connection:
+        if self.db is None:
+            self.db = sqlite3.connect(self.file)
+            self.db.execute("CREATE TABLE IF NOT EXISTS setting"
+                            " (id INTEGER PRIMARY KEY, value INTEGER NOT NULL)")
+        return self.db
+
+    def _select(self, user_id: int) -> int | None:
+        row = self._connect().execute("SELECT value FROM setting WHERE id = ?",
+                                      (user_id,)).fetchone()
+        return None if row is None else row[0]
+
+    def _write(self, entries: dict[int, int]) -> None:
+        db = self._connect()
+        with db:
+            db.executemany("INSERT OR REPLACE INTO setting VALUES (?, ?)",
+                           [(user_id, value) for user_id, value in entries.items()
+                            if value != self.default])
+            db.executemany("DELETE FROM setting WHERE id = ?",
+                           [(user_id,) for user_id, value in entries.items()
+                            if value == self.default])
+
+    def _close(self) -> None:
+        if self.db is not None:
+            self.db.close()
+            self.db = None
+
+    async def close(self) -> None:
+        """Writes all entries to the disk tier and closes it."""
+        for slot in self._live():
+            self.pending[self.ids[slot]] = self.values[slot] >> 32
+        self.ids = array("Q", [0]) * len(self.ids)
+        self.used = self.deleted = 0
+        self._flush()
+        await self._run(self._close)
+        self.executor.shutdown()
+
+
+def _benchmark(users: int = 1_000_000) -> None:
+    """Measures memory usage of ``SettingStore`` with ``users`` users.
+
+    It is compared with the per-user ``UserDict`` of 14 flags which deck
+    and roulette kept before, and with a plain ``dict`` of integers. All of
+    them hold every user in memory, so that the same working set is compared.
+
+    """
+    import asyncio
+    import tracemalloc
+    from collections import UserDict
+    from random import randrange
+    from tempfile import TemporaryDirectory
+
+    def measure(label: str, build: Callable[[], Any]) -> None:
+        tracemalloc.start()
+        built = build()
+        print(f"{label:<24}: {tracemalloc.get_traced_memory()[1] / 2**20:8.1f} MiB")
+        del built
+        tracemalloc.stop()
+
+    def objects() -> dict[int, UserDict]:
+        return {user_id: UserDict({flag: bool(randrange(2)) for flag in range(14)})
+                for user_id in range(1, users + 1)}
+
+    def plain() -> dict[int, int]:
+        return {user_id: randrange(1 << 14) for user_id in range(1, users + 1)}
+
+    async def run(file: str) -> None:
+        measure("dict of UserDict (before)", objects)
+        measure("dict of int", plain)
+
+        def store() -> SettingStore:
+            store = SettingStore("benchmark", 0, capacity=users, file=file)
+            for user_id in range(1, users + 1):
+                store[user_id] = randrange(1 << 14)
+            return store
+
+        measure("SettingStore", store)
+
+    with TemporaryDirectory() as tmpdir:
+        asyncio.run(run(f"{tmpdir}/benchmark.sqlite3"))
+
+
+if __name__ == "__main__":
+    _benchmark()
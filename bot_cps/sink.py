@@ -0,0 +1,253 @@
+"""
+A program that provides bot managed by bot_cps
+
+The GNU General Public License v3.0 (GPL-3.0)
+
+Copyright (C) 2021-present ster <ster.physics@gmail.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program. If not, see <https://www.gnu.org/licenses/>.
+
+"""
+
+__all__ = (
+    "LogSink",
+    "event_class",
+    "get_sink",
+)
+
+
+import logging
+from asyncio import (Queue, QueueEmpty, QueueFull, Task, TimeoutError,
+                     create_task, get_running_loop, sleep, wait_for)
+from collections import Counter
+from contextvars import Context
+from random import random
+from typing import Literal
+
+from discord import Client, Embed, Interaction, InteractionType, app_commands
+from discord.abc import Messageable
+
+from .config import config
+
+
+logger = logging.getLogger(__name__)
+
+
+class LogSink(object):
+    """Posts log embeds to a channel in batches from a background task.
+
+    ``put`` only enqueues the embed, so callers never wait for Discord.
+    Embeds are packed up to 10 per message, waiting at most ``window``
+    seconds for a batch to fill up.
+
+    Whether each interaction is posted is decided by ``admit`` according to
+    the policy of its class (see ``config.log_policy``).
+
+    """
+
+    # limits of a message imposed by Discord
+    MAX_EMBEDS = 10
+    MAX_CHARACTERS = 6000
+
+    def __init__(self, client: Client, channel_id: int, policy: dict[str, str],
+                 maxsize: int = 1000, window: float = 5.) -> None:
+        """Constructor of this class.
+
+        Parameters
+        ----------
+        client: :class:`discord.Client`
+            Client which sends logs.
+        channel_id: :class:`int`
+            ID of the channel to which logs are sent.
+        policy: Dict[:class:`str`, :class:`str`]
+            Log policy of each interaction class.
+        maxsize: :class:`int`
+            Maximum number of queued embeds. Embeds beyond this are dropped.
+        window: :class:`float`
+            Maximum seconds to wait for a batch to fill up.
+
+        """
+        self.client: Client = client
+        self.channel_id: int = channel_id
+        self.policy: dict[str, str] = policy
+        self.window: float = window
+
+        # counts of aggregated interactions in the current minute
+        self.counts: Counter[tuple[str, str]] = Counter()
+        self.guilds: set[int | None] = set()
+        self.aggregator: Task | None = None
+
+        # ``None`` tells the background task to stop
+        self.queue: Queue[Embed | None] = Queue(maxsize)
+        self.channel: Messageable | None = None
+        self.task: Task | None = None
+
+        # embeds taken from the queue and not sent yet
+        self.batch: list[Embed] = []
+
+        self.sent: int = 0
+        self.dropped: int = 0
+        self.closed: bool = False
+
+    @property
+    def depth(self) -> int:
+        """Number of embeds waiting to be sent."""
+        return self.queue.qsize()
+
+    def admit(self, kind: str, name: str, guild_id: int | None) -> bool:
+        """Decides whether the interaction should be posted by itself."""
+        policy = self.policy.get(kind, "full")
+
+        if policy == "full":
+            return True
+        if policy.startswith("sample:"):
+            return random() < float(policy[7:])
+        if policy == "aggregate":
+            if self.aggregator is None or self.aggregator.done():
+                # not inside the command which happens to start it, like the task below
+                self.aggregator = Context().run(create_task, self._aggregate())
+            self.counts[kind, name] += 1
+            self.guilds.add(guild_id)
+        return False
+
+    async def _aggregate(self) -> None:
+        while True:
+            await sleep(60)
+            self._summarize()
+
+    def _summarize(self) -> None:
+        """Puts the counts of the last minute as one embed."""
+        if not self.counts:
+            return
+
+        description = f"Guilds: `{len(self.guilds)}`\n"
+        for (kind, name), count in self.counts.most_common():
+            description += f"{kind}: `{name}` × {count}\n"
+        self.put(Embed(title="Interactions in the last minute", description=description))
+
+        self.counts.clear()
+        self.guilds.clear()
+        return
+
+    def put(self, embed: Embed) -> None:
+        """Enqueues ``embed`` and returns immediately."""
+        if self.closed:
+            self.dropped += 1
+            return
+
+        if self.task is None or self.task.done():
+            # in an empty context, so that its requests are not charged to
+            # the command which happens to start it
+            self.task = Context().run(create_task, self._run())
+
+        try:
+            self.queue.put_nowait(embed)
+        except QueueFull:
+            self.dropped += 1
+        return
+
+    async def _run(self) -> None:
+        loop = get_running_loop()
+        stopping = False
+        while not stopping:
+            embed = await self.queue.get()
+            if embed is None:
+                break
+            self.batch.append(embed)
+            deadline = loop.time() + self.window
+
+            while len(self.batch) < self.MAX_EMBEDS:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    embed = await wait_for(self.queue.get(), timeout)
+                except TimeoutError:
+                    break
+                if embed is None:
+                    stopping = True
+                    break
+                await self._add(embed)
+
+            await self._send(self.batch)
+            self.batch = []
+
+    async def _add(self, embed: Embed) -> None:
+        """Adds ``embed`` to the batch, sending the batch first if it would overflow."""
+        if len(self.batch) == self.MAX_EMBEDS \
+           or sum(map(len, self.batch)) + len(embed) > self.MAX_CHARACTERS:
+            await self._send(self.batch)
+            self.batch = []
+        self.batch.append(embed)
+        return
+
+    async def _send(self, embeds: list[Embed]) -> None:
+        try:
+            if self.channel is None:
+                self.channel = self.client.get_channel(self.channel_id) \
+                            or await self.client.fetch_channel(self.channel_id)
+            await self.channel.send(embeds=embeds)
+            self.sent += len(embeds)
+        except Exception:
+            self.dropped += len(embeds)
+            logger.exception(f"Failed to send {len(embeds)} logs.")
+        return
+
+    async def close(self) -> None:
+        """Stops the background task and sends all queued embeds."""
+        if self.aggregator is not None:
+            self.aggregator.cancel()
+        self._summarize()
+        self.closed = True
+
+        # lets the background task send what it has taken and stop by itself
+        if self.task is not None and not self.task.done():
+            await self.queue.put(None)
+            await self.task
+
+        while True:
+            try:
+                embed = self.queue.get_nowait()
+            except QueueEmpty:
+                break
+            if embed is not None:
+                await self._add(embed)
+
+        if self.batch != []:
+            await self._send(self.batch)
+            self.batch = []
+
+        logger.info(f"Log sink closed: {self.sent} sent, {self.dropped} dropped.")
+        return
+
+
+def get_sink(client: Client) -> LogSink | None:
+    """Obtains the ``LogSink`` of ``client``, or ``None`` if logging is disabled."""
+    channel_id: int = int(getattr(client, "channel_id", 0))
+    if channel_id == 0:
+        return None
+
+    if not hasattr(client, "log_sink"):
+        policy = config.log_policy | getattr(client, "log_policy", {})
+        client.log_sink = LogSink(client, channel_id, policy)
+    return client.log_sink
+
+
+def event_class(interaction: Interaction) -> Literal["command", "context_menu", "view"]:
+    """Classifies ``interaction`` for the log policy."""
+    if interaction.type == InteractionType.component:
+        return "view"
+    if isinstance(interaction.command, app_commands.ContextMenu):
+        return "context_menu"
+    return "command"
@@ -21,15 +21,17 @@ along with this program. If not, see <https://www.gnu.org/licenses/>.
 """
 
 import logging
-from io import BytesIO
 from typing import Literal
 
 from compass import StageData
-from discord import File, app_commands
+from discord import app_commands
 from discord.ext import commands
 from discord.ext.commands import Bot, Context
 
 from .base import Cog
+from .metric import metric
+from .render import render
+from .tracing import tracer
 from .translator import locale_str as _
 
 
@@ -51,20 +53,17 @@ class Stage(Cog):
 
     @commands.hybrid_command(
         description = _("ステージガチャ"),
+        extras = {"render": True},
     )
     @app_commands.describe(
         number = _("１チームあたりの人数を選んでね！"),
     )
     async def stage(self, ctx: Context, number: Literal[2, 3] = 3) -> None:
-        await ctx.defer()
-
         ret_stage = self.data.get_stage(number=number, only_available=False)
 
-        img = ret_stage.generate_image(ctx.interaction.locale.value)
-
-        image_bytes = BytesIO()
-        img.save(image_bytes, "PNG", quality=100, optimize=True)
-        image_bytes.seek(0)
+        img = await render.run(ret_stage.generate_image, ctx.interaction.locale.value)
+        file = await render.file(img, f"{ctx.author.id}.png")
 
-        await ctx.send(file=File(fp=image_bytes, filename=f"{ctx.author.id}.png"))
+        with metric.timer("upload"), tracer.span("upload"):
+            await ctx.send(file=file)
         return
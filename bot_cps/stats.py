@@ -0,0 +1,147 @@
+"""
+A program that provides bot managed by bot_cps
+
+The GNU General Public License v3.0 (GPL-3.0)
+
+Copyright (C) 2021-present ster <ster.physics@gmail.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program. If not, see <https://www.gnu.org/licenses/>.
+
+"""
+
+import logging
+
+from discord import Embed, app_commands
+from discord.ext import commands
+from discord.ext.commands import Bot, Context
+
+from .base import Cog
+from .config import config
+from .lag import lag
+from .metric import PHASES, metric
+from .profiler import profiler
+from .translator import locale_str as _
+
+
+logger = logging.getLogger(__name__)
+
+
+async def setup(bot: Bot) -> None:
+    await bot.add_cog(Stats(bot))
+
+
+async def teardown(bot: Bot) -> None:
+    await bot.remove_cog("Stats")
+
+
+class Stats(Cog):
+    def __init__(self, bot: Bot) -> None:
+        super().__init__(bot, logger)
+
+    @commands.hybrid_command(
+        description = _("コマンドの処理時間の統計を表示する"),
+        extras = {"ephemeral": True},
+    )
+    @app_commands.describe(
+        command = _("コマンドの名前（指定しない場合，全てのコマンドの合計時間が表示される）"),
+    )
+    async def stats(self, ctx: Context, command: str = "") -> None:
+        locale = ctx.interaction.locale
+
+        if not await self.check_owner(ctx):
+            return
+
+        if not metric.enabled:
+            content = _("統計は無効になっています").to(locale)
+            await ctx.send(content=content, ephemeral=True)
+            return
+
+        snapshot = metric.snapshot()
+        if command != "" and command not in snapshot:
+            content = _("{0} の統計はまだないよ！").to(locale).format(command)
+            await ctx.send(content=content, ephemeral=True)
+            return
+
+        if command == "":
+            title = "total"
+            rows = {name: phases["total"] for name, phases in snapshot.items()}
+        else:
+            title = command
+            rows = {phase: snapshot[command][phase] for phase in PHASES}
+
+        description = f"{'':<16}{'count':>7}{'p50':>8}{'p95':>8}{'max':>8}\n"
+        for name, row in rows.items():
+            description += f"{name[:16]:<16}{row['count']:>7}" \
+                           + "".join(f"{row[key]*1000:>6.0f}ms" for key in ("p50", "p95", "max")) \
+                           + "\n"
+
+        embed = Embed(title=title, description=f"```\n{description[:4000]}```", color=config.color)
+        await ctx.send(embed=embed, ephemeral=True)
+        return
+
+    @commands.hybrid_command(
+        description = _("イベントループを止めたコマンドを表示する"),
+        extras = {"ephemeral": True},
+    )
+    async def lag(self, ctx: Context) -> None:
+        if not await self.check_owner(ctx):
+            return
+
+        if not lag.running:
+            content = _("ラグモニターは無効になっているよ！").to(ctx.interaction.locale)
+            await ctx.send(content=content, ephemeral=True)
+            return
+
+        offenders = lag.worst(5)
+        if offenders == []:
+            content = _("イベントループは止まっていないよ！").to(ctx.interaction.locale)
+            await ctx.send(content=content, ephemeral=True)
+            return
+
+        description = f"{'':<24}{'count':>7}{'total':>10}{'worst':>10}\n"
+        for offender in offenders:
+            description += f"{offender.name[:24]:<24}{offender.count:>7}" \
+                           f"{offender.total*1000:>8.0f}ms{offender.worst*1000:>8.0f}ms\n"
+
+        embed = Embed(title="lag", description=f"```\n{description}```", color=config.color)
+        embed.add_field(name=offenders[0].name,
+                        value=f"```\n{offenders[0].stack[-1000:]}```", inline=False)
+        await ctx.send(embed=embed, ephemeral=True)
+        return
+
+    @commands.hybrid_command(
+        description = _("コマンドのプロファイルを取る"),
+        extras = {"ephemeral": True},
+    )
+    @app_commands.describe(
+        command = _("コマンドの名前（ビューの場合は view:名前）"),
+        count = _("プロファイルを取る回数を指定してね！"),
+    )
+    async def profile(self, ctx: Context, command: str,
+                      count: app_commands.Range[int, 1, 100] = 10) -> None:
+        if not await self.check_owner(ctx):
+            return
+
+        profiler.arm(command, count)
+        content = _("次の {1} 回の {0} のプロファイルを取るよ！").to(ctx.interaction.locale)
+        await ctx.send(content=content.format(command, count), ephemeral=True)
+        return
+
+    async def check_owner(self, ctx: Context) -> bool:
+        """Checks that the author owns the bot, replying if not."""
+        if await self.bot.is_owner(ctx.author):
+            return True
+        content = _("オーナーのみ使用できます！").to(ctx.interaction.locale)
+        await ctx.send(content=content, ephemeral=True)
+        return False
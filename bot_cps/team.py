@@ -23,6 +23,7 @@ along with this program. If not, see <https://www.gnu.org/licenses/>.
 
 import logging
 from enum import Enum
+from io import BytesIO
 from random import sample
 from typing import Callable
 
@@ -32,9 +33,11 @@ from discord.ext import commands
 from discord.ext.commands import Bot, Context
 from discord.interactions import Interaction
 
+from .asset import asset
 from .base import Cog, View, context_menu_before_invoke
 from .config import config
-from .path import path
+from .metric import metric
+from .tracing import tracer
 from .translator import locale_str as _
 
 
@@ -71,8 +74,6 @@ class Team(Cog):
         description = _("チーム分けを行う"),
     )
     async def team(self, ctx: Context) -> None:
-        await ctx.defer()
-
         if ctx.guild.id in self.team_dict:
             self.team_dict[ctx.guild.id].disable()
             old = self.team_dict[ctx.guild.id]
@@ -216,6 +217,9 @@ class SyncButton(ui.Button):
 
 
 class DivideButton(ui.Button):
+    # double clicks are dropped while running
+    exclusive = True
+
     def __init__(self, locale: Locale) -> None:
         super().__init__()
 
@@ -237,7 +241,8 @@ class DivideButton(ui.Button):
 
         members = list(map(lambda member: str(member), self.view.members))
         td = TeamDivide(members, self.view.number)
-        await interaction.followup.send(files=td.files, embeds=td.embeds)
+        with metric.timer("upload"), tracer.span("upload"):
+            await interaction.followup.send(files=td.files, embeds=td.embeds)
         return
 
 
@@ -404,9 +409,9 @@ class Confirm(View):
 
 class Color(tuple[int, str], Enum):
 
-    BLUE = (0x0000ff, path.blue_team)
-    RED = (0xFF0000, path.red_team)
-    WHITE = (0xFFFFFF, path.white_team)
+    BLUE = (0x0000ff, "blue")
+    RED = (0xFF0000, "red")
+    WHITE = (0xFFFFFF, "white")
 
     def __int__(self) -> int:
         return self.value[0]
@@ -461,7 +466,7 @@ class TeamDivide(object):
 
     def prepare(self, members: list[str], color: Color) -> None:
         """Prepares discord ``Embed``s and ``File``s."""
-        file = File(str(color), f"{hash(members[0])}.png")
+        file = File(BytesIO(asset.team[str(color)]), f"{hash(members[0])}.png")
         embed = Embed(color=int(color))
         embed.set_author(name="　".join(members),
                          icon_url=f"attachment://{file.filename}")
@@ -20,7 +20,6 @@ along with this program. If not, see <https://www.gnu.org/licenses/>.
 
 """
 
-import json
 import logging
 from datetime import datetime
 from re import split
@@ -28,8 +27,7 @@ from re import split
 from discord.ext import commands
 from discord.ext.commands import Bot, Context
 
-from .base import Cog, send_tos
-from .path import path
+from .base import Cog, agreed, send_tos
 from .translator import locale_str as _
 
 
@@ -50,6 +48,7 @@ class Tos(Cog):
 
     @commands.hybrid_command(
         description = _("利用規約を確認する"),
+        extras = {"ephemeral": True},
     )
     async def tos(self, ctx: Context) -> None:
         await send_tos(ctx.interaction)
@@ -61,10 +60,6 @@ class Tos(Cog):
 
     def agreed_epoch(self, ctx: Context) -> int:
         """Obtains epoch time to have agreed Terms of Service."""
-        with open(path.agreed_json, "r") as f:
-            agreed_list = json.load(f)
-
-        for agreed in agreed_list:
-            if agreed["id"] == int(ctx.author.id):
-                date_list = list(map(lambda el: int(el), split(r"/|:| ", agreed["date"])))
-                return int(datetime(*date_list).timestamp())
+        date = agreed.get(ctx.author.id)["date"]
+        date_list = list(map(lambda el: int(el), split(r"/|:| ", date)))
+        return int(datetime(*date_list).timestamp())
@@ -0,0 +1,250 @@
+"""
+A program that provides bot managed by bot_cps
+
+The GNU General Public License v3.0 (GPL-3.0)
+
+Copyright (C) 2021-present ster <ster.physics@gmail.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program. If not, see <https://www.gnu.org/licenses/>.
+
+"""
+
+__all__ = (
+    "Span",
+    "tracer",
+)
+
+
+import json
+import logging
+from argparse import ArgumentParser, Namespace
+from asyncio import get_running_loop
+from contextvars import ContextVar, Token
+from dataclasses import dataclass, field
+from itertools import count
+from random import random
+from time import perf_counter, time
+from typing import Any, Iterator
+
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Span:
+    """A timed step of an interaction."""
+    name: str
+    span_id: int
+    parent_id: int | None
+    start: float
+    end: float = 0.
+    attrs: dict[str, Any] = field(default_factory=dict)
+
+
+class Trace(object):
+    """Spans of one interaction."""
+
+    __slots__ = ("epoch", "ids", "spans")
+
+    def __init__(self, name: str, elapsed: float, attrs: dict[str, Any]) -> None:
+        self.epoch: float = time() - elapsed
+        self.ids = count()
+        self.spans: list[Span] = [Span(name, next(self.ids), None, perf_counter() - elapsed,
+                                       attrs=attrs)]
+
+    @property
+    def root(self) -> Span:
+        return self.spans[0]
+
+    def add(self, name: str, parent: Span, attrs: dict[str, Any]) -> Span:
+        span = Span(name, next(self.ids), parent.span_id, perf_counter(), attrs=attrs)
+        self.spans.append(span)
+        return span
+
+    def to_dict(self) -> dict[str, Any]:
+        origin = self.root.start
+        return {
+            "ts": self.epoch,
+            "name": self.root.name,
+            "duration": self.root.end - origin,
+            "spans": [{
+                "name": span.name,
+                "id": span.span_id,
+                "parent": span.parent_id,
+                "offset": span.start - origin,
+                "duration": span.end - span.start,
+                **({"attrs": span.attrs} if span.attrs else {}),
+            } for span in self.spans],
+        }
+
+
+class SpanContext(object):
+    """Opens a child span of the current span in a ``with`` block."""
+
+    __slots__ = ("trace", "name", "attrs", "span", "token")
+
+    def __init__(self, trace: Trace, name: str, attrs: dict[str, Any]) -> None:
+        self.trace: Trace = trace
+        self.name: str = name
+        self.attrs: dict[str, Any] = attrs
+        self.span: Span | None = None
+        self.token: Token | None = None
+
+    def __enter__(self) -> "SpanContext":
+        self.span = self.trace.add(self.name, tracer.parent.get(), self.attrs)
+        self.token = tracer.parent.set(self.span)
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        self.span.end = perf_counter()
+        tracer.parent.reset(self.token)
+
+
+class _NullSpan(object):
+    """Does nothing, used outside traced interactions."""
+
+    __slots__ = ()
+
+    def __enter__(self) -> "_NullSpan":
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        pass
+
+
+_null_span = _NullSpan()
+
+
+class Tracer(object):
+    """Traces interactions with spans propagated through context variables.
+
+    A trace is started when a command or view is invoked and finished
+    after it. Finished traces slower than ``slow`` seconds, and a ``rate``
+    fraction of the others, are appended to ``traces.jsonl`` in
+    ``directory``. Tracing is disabled while ``directory`` is empty.
+
+    ```python
+    tracer.begin("deck", since(interaction))
+    with tracer.span("render"):
+        ...
+    tracer.finish()
+    ```
+
+    """
+
+    def __init__(self) -> None:
+        self.directory: str = ""
+        self.slow: float = 1.
+        self.rate: float = .01
+        self.exported: int = 0
+
+        self.trace: ContextVar[Trace | None] = ContextVar("trace", default=None)
+        self.parent: ContextVar[Span | None] = ContextVar("parent", default=None)
+
+    def begin(self, name: str, elapsed: float = 0., **attrs: Any) -> None:
+        """Starts a trace in the current context.
+
+        Parameters
+        ----------
+        name: :class:`str`
+            Name of the root span.
+        elapsed: :class:`float`
+            Seconds elapsed since the interaction was created.
+        **attrs: Any
+            Attributes of the root span.
+
+        """
+        if self.directory == "":
+            return
+        trace = Trace(name, elapsed, attrs)
+        self.trace.set(trace)
+        self.parent.set(trace.root)
+        return
+
+    def span(self, name: str, **attrs: Any) -> SpanContext | _NullSpan:
+        """Obtains a context manager which records a span if a trace is running."""
+        trace = self.trace.get()
+        if trace is None:
+            return _null_span
+        return SpanContext(trace, name, attrs)
+
+    def finish(self) -> None:
+        """Finishes the trace in the current context and exports it if sampled."""
+        trace = self.trace.get()
+        if trace is None:
+            return
+        self.trace.set(None)
+        self.parent.set(None)
+
+        trace.root.end = perf_counter()
+        if trace.root.end - trace.root.start < self.slow and random() >= self.rate:
+            return
+
+        line = json.dumps(trace.to_dict(), ensure_ascii=False) + "\n"
+        get_running_loop().run_in_executor(None, self._write, line)
+        self.exported += 1
+        return
+
+    def _write(self, line: str) -> None:
+        try:
+            with open(f"{self.directory}/traces.jsonl", "a") as f:
+                f.write(line)
+        except OSError:
+            logger.exception("Failed to export a trace.")
+
+
+tracer = Tracer()
+
+del Tracer
+
+
+def _tree(spans: list[dict[str, Any]], parent: int | None = None,
+          depth: int = 0) -> Iterator[str]:
+    """Yields lines of spans indented by their depth."""
+    for span in spans:
+        if span["parent"] == parent:
+            name = "  " * depth + span["name"]
+            yield f"{name:<32}{span['offset']*1000:>12.1f}{span['duration']*1000:>12.1f}"
+            yield from _tree(spans, span["id"], depth + 1)
+
+
+def get_option() -> Namespace:
+    argparser = ArgumentParser(prog="python -m bot_cps.tracing",
+                               description="Shows the slowest traces written by bot_cps.")
+    argparser.add_argument("file", help="traces.jsonl written by bot_cps.")
+    argparser.add_argument("--name", default=None,
+                           help="Shows only traces of this command or view.")
+    argparser.add_argument("--top", type=int, default=5,
+                           help="Number of traces to show.")
+    return argparser.parse_args()
+
+
+def main() -> None:
+    args = get_option()
+
+    with open(args.file) as f:
+        traces = [json.loads(line) for line in f]
+    if args.name is not None:
+        traces = [trace for trace in traces if trace["name"] == args.name]
+
+    for trace in sorted(traces, key=lambda trace: -trace["duration"])[:args.top]:
+        print(f"{trace['name']} at {trace['ts']:.0f}: {trace['duration']*1000:.1f}ms")
+        print(f"{'span':<32}{'offset [ms]':>12}{'[ms]':>12}")
+        for line in _tree(trace["spans"]):
+            print(line)
+        print()
+
+
+if __name__ == "__main__":
+    main()
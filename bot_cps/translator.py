@@ -27,6 +27,7 @@ __all__ = (
 
 
 import gettext
+from functools import lru_cache
 from glob import glob
 from os.path import basename
 from typing import Callable
@@ -37,9 +38,12 @@ from discord.app_commands.translator import TranslationContextTypes
 from .path import path
 
 
+@lru_cache(maxsize=None)
 def _get_translator(locale: Locale = Locale.japanese) -> Callable[[str], str]:
     """Defines ``_`` to translate.
 
+    Translators are cached for each locale, so the catalogs are read once.
+
     Parameters
     ----------
     locale: :class:`discord.Locale`
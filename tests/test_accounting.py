@@ -0,0 +1,198 @@
+"""
+Checks that REST requests are charged to the command which sends them.
+
+``bot_cps.accounting.instrument`` patches internals of discord.py, so these
+tests fail rather than the accounting silently stopping when an upgrade of
+discord.py renames them.
+"""
+
+import asyncio
+import inspect
+
+import pytest
+
+discord = pytest.importorskip("discord")
+
+from discord.webhook.async_ import async_context
+
+from bot_cps.accounting import instrument, ledger
+from bot_cps.sink import LogSink
+
+
+def test_http_client_request_exists() -> None:
+    params = inspect.signature(discord.http.HTTPClient.request).parameters
+    assert "route" in params
+    assert any(param.kind is param.VAR_KEYWORD for param in params.values())
+
+
+def test_webhook_adapter_request_exists() -> None:
+    adapter = async_context.get()
+    params = inspect.signature(adapter.request).parameters
+    assert "route" in params
+    assert "files" in params
+
+
+def test_instrument_charges_requests() -> None:
+    adapter = async_context.get()
+    original = adapter.request
+
+    async def request(*args, **kwargs) -> None:
+        return None
+
+    class HTTP:
+        pass
+
+    class Client:
+        http = HTTP()
+
+    async def run() -> int:
+        ledger.begin("test", None)
+        await Client.http.request()
+        await adapter.request(None, None, files=None)
+        rest = ledger.current.get()[2].rest
+        ledger.end()
+        return rest
+
+    Client.http.request = request
+    adapter.request = request
+    try:
+        instrument(Client())
+        assert asyncio.run(run()) == 2
+    finally:
+        adapter.request = original
+
+
+def test_log_sink_is_not_charged() -> None:
+    charged = []
+
+    class Channel:
+        async def send(self, embeds) -> None:
+            charged.append(ledger.current.get())
+
+    class Client:
+        def get_channel(self, channel_id: int) -> Channel:
+            return Channel()
+
+    async def run() -> None:
+        sink = LogSink(Client(), 1, {}, window=0.)
+        ledger.begin("test", None)
+        sink.put(discord.Embed(title="test"))
+        ledger.end()
+        await sink.close()
+
+    asyncio.run(run())
+    assert charged == [None]
+
+
+def test_render_command_within_budget(monkeypatch, tmp_path) -> None:
+    pytest.importorskip("compass")
+
+    from discord import utils
+    from PIL import Image
+
+    from bot_cps import base, deck
+    from bot_cps.setting import SettingStore
+
+    class Cards:
+        def generate_deck(self, locale: str) -> Image.Image:
+            return Image.new("RGBA", (320, 180), (255, 0, 0, 255))
+
+    class Pool:
+        def balance(self) -> Cards:
+            return Cards()
+
+    monkeypatch.setattr(deck, "get_pool", lambda argument: Pool())
+    monkeypatch.setattr(base.agreed, "get", lambda user_id: {"agreed": True})
+
+    adapter = async_context.get()
+    original = adapter.request
+    uploaded = []
+
+    async def request(*args, files=None, **kwargs) -> None:
+        uploaded.extend(file.fp.getbuffer().nbytes for file in files or ())
+
+    class HTTP:
+        pass
+
+    class Client:
+        http = HTTP()
+
+    class Bot:
+        async def wait_until_ready(self) -> None:
+            return None
+
+    class Response:
+        def __init__(self) -> None:
+            self.done = False
+
+        def is_done(self) -> bool:
+            return self.done
+
+        async def defer(self, ephemeral: bool = False) -> None:
+            self.done = True
+            await Client.http.request(None)
+
+    class Followup:
+        async def send(self, file=None, **kwargs) -> None:
+            await Client.http.request(None, files=[file])
+
+    class User:
+        id = 1
+
+    class Guild:
+        id = 2
+
+    class Interaction:
+        client = Client()
+        user = User()
+        guild = Guild()
+        guild_id = Guild.id
+        locale = discord.Locale.japanese
+
+        def __init__(self) -> None:
+            self.created_at = utils.utcnow()
+            self.response = Response()
+            self.followup = Followup()
+
+    class Context:
+        prefix = "/"
+        author = User()
+        guild = Guild()
+        kwargs = {"count": 3}
+
+        def __init__(self, command) -> None:
+            self.command = command
+            self.interaction = Interaction()
+
+        async def defer(self, ephemeral: bool = False) -> None:
+            await self.interaction.response.defer(ephemeral=ephemeral)
+
+    async def run() -> None:
+        cog = deck.Deck(Bot())
+        cog.settings = SettingStore("deck", deck.Argument().mask, file=str(tmp_path / "deck.db"))
+        ctx = Context(cog.deck)
+        try:
+            await cog.cog_before_invoke(ctx)
+            await cog.deck.callback(cog, ctx, 3)
+            await cog.cog_after_invoke(ctx)
+        finally:
+            await cog.settings.close()
+
+    Client.http.request = request
+    adapter.request = request
+    ledger.reset()
+    try:
+        instrument(Client())
+        asyncio.run(run())
+
+        # the defer and the followup with one composited image
+        usage = ledger.peaks["deck"]
+        assert usage.rest == 2
+        assert usage.encoded == usage.uploaded == sum(uploaded) > 0
+
+        ledger.check("deck", rest=2, encoded=2**20, uploaded=2**20)
+        with pytest.raises(AssertionError):
+            ledger.check("deck", rest=1)
+    finally:
+        adapter.request = original
+        ledger.reset()
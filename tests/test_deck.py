@@ -0,0 +1,85 @@
+"""
+Checks the image sent by ``/deck`` when several decks are generated.
+"""
+
+import asyncio
+
+import pytest
+
+pytest.importorskip("discord")
+pytest.importorskip("compass")
+
+from discord import Locale
+from PIL import Image
+
+from bot_cps import deck
+from bot_cps.render import render
+
+
+WIDTH, HEIGHT = 640, 360
+
+
+class Cards:
+    def generate_deck(self, locale: str) -> Image.Image:
+        return Image.new("RGBA", (WIDTH, HEIGHT), (255, 0, 0, 255))
+
+
+class Pool:
+    def balance(self) -> Cards:
+        return Cards()
+
+    def random(self) -> Cards:
+        return Cards()
+
+
+class Response:
+    def __init__(self) -> None:
+        self.done = False
+
+    def is_done(self) -> bool:
+        return self.done
+
+    async def defer(self) -> None:
+        self.done = True
+
+
+class Followup:
+    def __init__(self) -> None:
+        self.sent: list[dict] = []
+
+    async def send(self, **kwargs) -> None:
+        self.sent.append(kwargs)
+
+
+class User:
+    id = 1
+
+
+class Interaction:
+    locale = Locale.japanese
+    user = User()
+
+    def __init__(self) -> None:
+        self.response = Response()
+        self.followup = Followup()
+
+
+def test_composite_size() -> None:
+    images = [Image.new("RGBA", (WIDTH - 10 * idx, HEIGHT)) for idx in range(5)]
+    canvas = render.composite(images, 16)
+    assert canvas.size == (WIDTH, 5 * HEIGHT + 4 * 16)
+
+
+@pytest.mark.parametrize("count", [1, 3, 5])
+def test_send_deck_count(monkeypatch, count: int) -> None:
+    monkeypatch.setattr(deck, "get_pool", lambda argument: Pool())
+    interaction = Interaction()
+
+    asyncio.run(deck.Argument().send_deck(interaction, count))
+
+    assert len(interaction.followup.sent) == 1
+    sent = interaction.followup.sent[0]
+    sent["file"].fp.seek(0)
+    with Image.open(sent["file"].fp) as img:
+        assert img.size == (WIDTH, count * HEIGHT + (count - 1) * 16)
+    assert sent["embed"].image.url == f"attachment://{sent['file'].filename}"
@@ -0,0 +1,49 @@
+"""
+Checks that options of the command line reach the singletons used by cogs.
+
+Extensions are loaded by discord.py, which executes them again; options set
+on a copy of a module which the cogs do not import are silently ignored.
+"""
+
+import asyncio
+import sys
+
+import pytest
+
+pytest.importorskip("discord")
+pytest.importorskip("compass")
+
+from bot_cps.__main__ import Bot
+from bot_cps.config import config
+
+
+def test_setup_hook_keeps_options(tmp_path) -> None:
+    async def sync(*args, **kwargs) -> list:
+        return []
+
+    async def run() -> None:
+        bot = Bot(stats=True, trace_dir=str(tmp_path), trace_slow=.5,
+                  cooldown_policy=["user=1/60"])
+        bot.tree.sync = sync
+        try:
+            await bot.setup_hook()
+
+            # the modules the cogs actually use
+            base = sys.modules["bot_cps.base"]
+            deck = sys.modules[type(bot.get_cog("Deck")).__module__]
+
+            assert base.tracer.directory == str(tmp_path)
+            assert base.tracer.slow == .5
+            assert base.metric.enabled
+            assert base.cooldown.buckets["user"].count == 1
+            assert deck.metric is base.metric
+        finally:
+            for name in [*bot.extensions]:
+                await bot.unload_extension(name)
+            base = sys.modules["bot_cps.base"]
+            base.tracer.directory = ""
+            base.tracer.slow = 1.
+            base.metric.enabled = False
+            base.cooldown.configure(config.cooldown)
+
+    asyncio.run(run())
@@ -0,0 +1,90 @@
+"""
+Checks that clicks on ``bot_cps.base.View`` go through its ``_scheduled_task``.
+
+``View._scheduled_task`` overrides a private method of ``discord.ui.View``, so
+these tests fail rather than exclusive items and render admission silently
+stopping when an upgrade of discord.py renames it.
+"""
+
+import asyncio
+import inspect
+import logging
+
+import pytest
+
+discord = pytest.importorskip("discord")
+pytest.importorskip("compass")
+
+from discord import ui
+
+from bot_cps.base import View
+
+
+def test_view_scheduled_task_exists() -> None:
+    assert hasattr(ui.View, "_scheduled_task")
+    params = list(inspect.signature(ui.View._scheduled_task).parameters)
+    assert params == ["self", "item", "interaction"]
+
+
+def test_view_dispatch_item_schedules_task() -> None:
+    assert "self._scheduled_task(" in inspect.getsource(ui.View._dispatch_item)
+
+
+class Response:
+    def __init__(self) -> None:
+        self.deferred = 0
+
+    def is_done(self) -> bool:
+        return self.deferred > 0
+
+    async def defer(self) -> None:
+        self.deferred += 1
+
+
+class Interaction:
+    def __init__(self, custom_id: str) -> None:
+        self.data = {"custom_id": custom_id}
+        self.response = Response()
+        self.extras: dict = {}
+
+
+class Button(ui.Button):
+    exclusive = True
+
+    def __init__(self) -> None:
+        super().__init__(custom_id="test")
+        self.calls = 0
+        self.release = asyncio.Event()
+
+    async def callback(self, interaction: Interaction) -> None:
+        self.calls += 1
+        await self.release.wait()
+
+
+def test_view_override_runs() -> None:
+    async def run() -> tuple[int, list[int], int]:
+        view = View("test", None, logging.getLogger(__name__))
+
+        async def interaction_check(interaction: Interaction) -> bool:
+            return True
+
+        view.interaction_check = interaction_check
+        button = Button()
+        view.add_item(button)
+
+        first, second = Interaction("test"), Interaction("test")
+        task = view._dispatch_item(button, first)
+        await asyncio.sleep(0)
+        # the second click arrives while the first is running, so it is dropped
+        await asyncio.wait_for(view._dispatch_item(button, second), 1)
+        inflight = len(view.inflight)
+
+        button.release.set()
+        await task
+        return button.calls, [first.response.deferred, second.response.deferred], \
+               inflight - len(view.inflight)
+
+    calls, deferred, released = asyncio.run(run())
+    assert calls == 1
+    assert deferred == [0, 1]
+    assert released == 1